@@ -2,13 +2,32 @@
 
 import os
 import json
+import time
+import tempfile
+import threading
+import multiprocessing
 import numpy as np
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from typing import Dict, List, Any, Tuple, Optional
 from feature_extraction import extract_features
 
 # Path to where we'll store user personalization data
 DEFAULT_DB_PATH = r"C:\Users\rohan\OneDrive\Desktop\Datathon\user_phrases.json"
 
+# top-level DB key holding compacted libraries; raw examples stay under the user id
+PROTOTYPES_KEY = "__prototypes__"
+
+# serializes load -> modify -> save of the DB file (readers never need it: saves are atomic)
+_db_lock = threading.Lock()
+
+# bulk enrollment: one shared worker pool per process. "spawn" because the
+# API server is threaded, and forking a threaded process can deadlock the child.
+ENROLL_MAX_WORKERS = max(1, min(4, (os.cpu_count() or 1) - 1))
+ENROLL_MP_CONTEXT = multiprocessing.get_context("spawn")
+_enroll_pool = None
+_enroll_pool_lock = threading.Lock()
+
 
 # ---------- 1. Helpers for saving / loading the DB ----------
 
@@ -24,7 +43,10 @@ def load_user_db(db_path: str = DEFAULT_DB_PATH) -> Dict[str, Any]:
       ],
       "user_id_2": [...],
       ...
+      "__prototypes__": {"user_id_1": [{"label", "features", "count"}, ...]}
     }
+    The raw examples are never replaced by compaction; predict_phrase() uses a
+    user's prototypes when they exist.
     """
     if not os.path.exists(db_path):
         return {}
@@ -34,9 +56,21 @@ def load_user_db(db_path: str = DEFAULT_DB_PATH) -> Dict[str, Any]:
 
 
 def save_user_db(db: Dict[str, Any], db_path: str = DEFAULT_DB_PATH) -> None:
-    """Save the user personalization database to JSON."""
-    with open(db_path, "w") as f:
-        json.dump(db, f)
+    """
+    Save the user personalization database to JSON.
+    Written to a temp file and renamed over db_path, so a concurrent
+    load_user_db() sees the old or the new file, never a truncated one.
+    """
+    fd, tmp_path = tempfile.mkstemp(
+        dir=os.path.dirname(os.path.abspath(db_path)), suffix=".tmp"
+    )
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(db, f)
+        os.replace(tmp_path, db_path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
 
 
 # ---------- 2. Distance / similarity helpers ----------
@@ -63,25 +97,72 @@ def add_user_phrase(
         feature_vector: np.ndarray,
         label: str,
         db_path: str = DEFAULT_DB_PATH,
+        dedup_threshold: Optional[float] = None,
+        max_prototypes_per_label: Optional[int] = None,
 ) -> None:
     """
     Add a personalized phrase example for a given user.
     - user_id: e.g. "user_123"
     - feature_vector: 1D numpy array representing that audio sample
     - label: a human-readable phrase or tag, e.g. "i_am_hungry"
+
+    Online compaction (both off by default, i.e. every example is kept):
+    - dedup_threshold: merge into an existing same-label example whose cosine
+      similarity is >= this value, instead of appending
+    - max_prototypes_per_label: once a label has this many entries, merge into
+      the nearest one instead of appending
     """
-    db = load_user_db(db_path)
+    with _db_lock:
+        db = load_user_db(db_path)
+
+        if user_id not in db:
+            db[user_id] = []
+
+        for examples in _libraries(db, user_id):
+            _add_or_merge(
+                examples,
+                np.asarray(feature_vector, dtype=float),
+                label,
+                dedup_threshold=dedup_threshold,
+                max_prototypes_per_label=max_prototypes_per_label,
+            )
+
+        save_user_db(db, db_path)
+    print(f"✅ Added phrase '{label}' for user '{user_id}'. Total examples: {len(db[user_id])}")
 
-    if user_id not in db:
-        db[user_id] = []
 
-    db[user_id].append({
-        "label": label,
-        "features": feature_vector.tolist()
-    })
+def add_user_phrases(
+        user_id: str,
+        items: List[Tuple[np.ndarray, str]],
+        db_path: str = DEFAULT_DB_PATH,
+        dedup_threshold: Optional[float] = None,
+        max_prototypes_per_label: Optional[int] = None,
+) -> int:
+    """
+    Bulk version of add_user_phrase(): items is a list of (feature_vector, label).
+    The DB is loaded and written ONCE for the whole batch.
+    Returns the user's total number of stored entries.
+    """
+    with _db_lock:
+        db = load_user_db(db_path)
 
-    save_user_db(db, db_path)
-    print(f"✅ Added phrase '{label}' for user '{user_id}'. Total examples: {len(db[user_id])}")
+        if user_id not in db:
+            db[user_id] = []
+
+        libraries = _libraries(db, user_id)
+        for feature_vector, label in items:
+            for examples in libraries:
+                _add_or_merge(
+                    examples,
+                    np.asarray(feature_vector, dtype=float),
+                    label,
+                    dedup_threshold=dedup_threshold,
+                    max_prototypes_per_label=max_prototypes_per_label,
+                )
+
+        save_user_db(db, db_path)
+    print(f"✅ Added {len(items)} phrases for user '{user_id}'. Total examples: {len(db[user_id])}")
+    return len(db[user_id])
 
 
 def predict_phrase(
@@ -92,17 +173,34 @@ def predict_phrase(
         use_cosine: bool = True
 ) -> Tuple[Optional[str], float]:
     """
-    Predict the personalized phrase for a given user by KNN over stored examples.
+    Predict the personalized phrase for a given user by KNN over stored examples
+    (the user's compacted prototypes if compact_user_phrases() has been run).
     - Returns (predicted_label, confidence)
     - If user has no stored phrases, returns (None, 0.0)
     """
     db = load_user_db(db_path)
 
-    if user_id not in db or len(db[user_id]) == 0:
+    examples = db.get(PROTOTYPES_KEY, {}).get(user_id) or db.get(user_id)
+    if not examples:
         print(f"⚠️ No personalization data for user '{user_id}'.")
         return None, 0.0
 
-    examples = db[user_id]
+    return knn_vote(examples, feature_vector, k=k, use_cosine=use_cosine)
+
+
+def knn_vote(
+        examples: List[Dict[str, Any]],
+        feature_vector: np.ndarray,
+        k: int = 3,
+        use_cosine: bool = True
+) -> Tuple[Optional[str], float]:
+    """
+    KNN over an in-memory list of examples (raw or compacted prototypes).
+    Every entry gets one vote, whatever its "count": weighting by count would
+    let a heavily-enrolled label outvote closer neighbours of a rarer one.
+    """
+    if len(examples) == 0:
+        return None, 0.0
 
     # Compute similarity or distance to each stored example
     scores = []
@@ -157,6 +255,214 @@ def predict_phrase(
             confidence = 1.0 / (1.0 + avg_dist)
 
     return best_label, confidence
+
+
+# ---------- 3b. Library compaction: dedup + per-label prototypes ----------
+
+def _merge_into(entry: Dict[str, Any], feature_vector: np.ndarray, count: int = 1) -> None:
+    """Fold feature_vector into entry as a count-weighted running mean."""
+    n = entry.get("count", 1)
+    merged = (np.array(entry["features"]) * n + feature_vector * count) / (n + count)
+    entry["features"] = merged.tolist()
+    entry["count"] = n + count
+
+
+def _libraries(db: Dict[str, Any], user_id: str) -> List[List[Dict[str, Any]]]:
+    """The user's raw example list, plus their prototype list if they have one."""
+    libraries = [db.setdefault(user_id, [])]
+    prototypes = db.get(PROTOTYPES_KEY, {}).get(user_id)
+    if prototypes is not None:
+        libraries.append(prototypes)
+    return libraries
+
+
+def _add_or_merge(
+        examples: List[Dict[str, Any]],
+        feature_vector: np.ndarray,
+        label: str,
+        dedup_threshold: Optional[float] = None,
+        max_prototypes_per_label: Optional[int] = None,
+) -> None:
+    """Append a new example, or merge it into its nearest same-label entry (online mode)."""
+    same_label = [ex for ex in examples if ex["label"] == label]
+
+    if same_label and (dedup_threshold is not None or max_prototypes_per_label is not None):
+        sims = [cosine_similarity(feature_vector, ex["features"]) for ex in same_label]
+        nearest = int(np.argmax(sims))
+
+        is_duplicate = dedup_threshold is not None and sims[nearest] >= dedup_threshold
+        is_full = max_prototypes_per_label is not None and len(same_label) >= max_prototypes_per_label
+        if is_duplicate or is_full:
+            _merge_into(same_label[nearest], feature_vector)
+            return
+
+    examples.append({
+        "label": label,
+        "features": feature_vector.tolist()
+    })
+
+
+def compact_examples(
+        examples: List[Dict[str, Any]],
+        max_prototypes_per_label: Optional[int] = None,
+        dedup_threshold: float = 0.995,
+        random_state: int = 42,
+) -> List[Dict[str, Any]]:
+    """
+    Summarize a user's examples:
+    1. merge near-duplicates (cosine >= dedup_threshold) within each label
+    2. if max_prototypes_per_label is set and a label still has more entries,
+       replace them with k-means centroids (count-weighted)
+    Each returned entry carries "count" = number of original examples it stands for.
+    """
+    from sklearn.cluster import KMeans
+
+    by_label: Dict[str, List[Dict[str, Any]]] = {}
+    for ex in examples:
+        by_label.setdefault(ex["label"], []).append(ex)
+
+    compacted = []
+    for label, group in by_label.items():
+        # 1. dedup
+        deduped: List[Dict[str, Any]] = []
+        for ex in group:
+            feat = np.asarray(ex["features"], dtype=float)
+            count = ex.get("count", 1)
+            sims = [cosine_similarity(feat, d["features"]) for d in deduped]
+            if sims and max(sims) >= dedup_threshold:
+                _merge_into(deduped[int(np.argmax(sims))], feat, count)
+            else:
+                deduped.append({"label": label, "features": feat.tolist(), "count": count})
+
+        if max_prototypes_per_label is None or len(deduped) <= max_prototypes_per_label:
+            compacted.extend(deduped)
+            continue
+
+        # 2. k-means prototypes
+        X = np.array([d["features"] for d in deduped])
+        w = np.array([d["count"] for d in deduped])
+        km = KMeans(n_clusters=max_prototypes_per_label, n_init=10, random_state=random_state)
+        assignments = km.fit_predict(X, sample_weight=w)
+
+        for c, centroid in enumerate(km.cluster_centers_):
+            cluster_count = int(w[assignments == c].sum())
+            if cluster_count == 0:
+                continue
+            compacted.append({
+                "label": label,
+                "features": centroid.tolist(),
+                "count": cluster_count,
+            })
+
+    return compacted
+
+
+def compact_user_phrases(
+        user_id: str,
+        db_path: str = DEFAULT_DB_PATH,
+        max_prototypes_per_label: Optional[int] = None,
+        dedup_threshold: float = 0.995,
+) -> Dict[str, int]:
+    """
+    Compaction job: build per-label prototypes from the user's raw examples
+    and store them under PROTOTYPES_KEY, where predict_phrase() picks them up.
+    The raw examples are kept, so this can be re-run with other settings
+    (check them with compaction_report() first) or undone with
+    drop_user_prototypes().
+    The default only merges near-duplicates; a k-means cap
+    (max_prototypes_per_label) is faster but can cost accuracy.
+    Returns {"before": n_examples, "after": n_prototypes}.
+    """
+    with _db_lock:
+        db = load_user_db(db_path)
+        examples = db.get(user_id, [])
+
+        compacted = compact_examples(
+            examples,
+            max_prototypes_per_label=max_prototypes_per_label,
+            dedup_threshold=dedup_threshold,
+        )
+        db.setdefault(PROTOTYPES_KEY, {})[user_id] = compacted
+        save_user_db(db, db_path)
+
+    print(f"✅ Compacted '{user_id}': {len(examples)} examples -> {len(compacted)} prototypes")
+    return {"before": len(examples), "after": len(compacted)}
+
+
+def drop_user_prototypes(user_id: str, db_path: str = DEFAULT_DB_PATH) -> bool:
+    """Undo compact_user_phrases(): predict_phrase() goes back to the raw examples."""
+    with _db_lock:
+        db = load_user_db(db_path)
+        if db.get(PROTOTYPES_KEY, {}).pop(user_id, None) is None:
+            return False
+        save_user_db(db, db_path)
+        return True
+
+
+def compaction_report(
+        user_id: str,
+        db_path: str = DEFAULT_DB_PATH,
+        max_prototypes_per_label: Optional[int] = None,
+        dedup_threshold: float = 0.995,
+        holdout_every: int = 5,
+        k: int = 3,
+        use_cosine: bool = True,
+) -> Dict[str, Any]:
+    """
+    Measure what compaction does to accuracy and k-NN latency, without
+    modifying the DB. Every `holdout_every`-th example of each label is held
+    out; the rest is used as the library, raw vs compacted.
+    """
+    db = load_user_db(db_path)
+    examples = db.get(user_id, [])
+
+    seen: Dict[str, int] = {}
+    library, holdout = [], []
+    for ex in examples:
+        i = seen.get(ex["label"], 0)
+        seen[ex["label"]] = i + 1
+        (holdout if i % holdout_every == holdout_every - 1 else library).append(ex)
+
+    compacted = compact_examples(
+        library,
+        max_prototypes_per_label=max_prototypes_per_label,
+        dedup_threshold=dedup_threshold,
+    )
+
+    def _evaluate(lib):
+        if not holdout:
+            return {"size": len(lib), "accuracy": None, "balanced_accuracy": None, "avg_latency_ms": None}
+        hits: Dict[str, int] = {}
+        totals: Dict[str, int] = {}
+        t0 = time.perf_counter()
+        for ex in holdout:
+            pred, _ = knn_vote(lib, np.array(ex["features"]), k=k, use_cosine=use_cosine)
+            totals[ex["label"]] = totals.get(ex["label"], 0) + 1
+            hits[ex["label"]] = hits.get(ex["label"], 0) + int(pred == ex["label"])
+        elapsed = time.perf_counter() - t0
+        return {
+            "size": len(lib),
+            "accuracy": sum(hits.values()) / len(holdout),
+            # mean per-label recall: the holdout is as imbalanced as enrollment,
+            # so plain accuracy mostly measures the most-recorded label
+            "balanced_accuracy": float(np.mean([hits[lbl] / totals[lbl] for lbl in totals])),
+            "avg_latency_ms": elapsed * 1000.0 / len(holdout),
+        }
+
+    report = {
+        "holdout_size": len(holdout),
+        "before": _evaluate(library),
+        "after": _evaluate(compacted),
+    }
+
+    print(f"Compaction report for '{user_id}' (holdout={len(holdout)}):")
+    for stage in ("before", "after"):
+        r = report[stage]
+        print(f"  {stage:>6}: size={r['size']}, accuracy={r['accuracy']}, "
+              f"balanced_accuracy={r['balanced_accuracy']}, avg_latency_ms={r['avg_latency_ms']}")
+    return report
+
+
 # ---------- 4. Audio-path wrappers using Module 1 features ----------
 
 def add_user_phrase_from_audio_path(
@@ -175,6 +481,139 @@ def add_user_phrase_from_audio_path(
     add_user_phrase(user_id, feature_vector, label, db_path=db_path)
 
 
+def start_enrollment_pool() -> ProcessPoolExecutor:
+    """The shared enrollment pool (created on first use; the API creates it at startup)."""
+    global _enroll_pool
+    with _enroll_pool_lock:
+        if _enroll_pool is None:
+            _enroll_pool = ProcessPoolExecutor(
+                max_workers=ENROLL_MAX_WORKERS, mp_context=ENROLL_MP_CONTEXT
+            )
+        return _enroll_pool
+
+
+def shutdown_enrollment_pool() -> None:
+    global _enroll_pool
+    with _enroll_pool_lock:
+        pool, _enroll_pool = _enroll_pool, None
+    if pool is not None:
+        pool.shutdown()
+
+
+def _discard_broken_pool(pool: ProcessPoolExecutor) -> None:
+    """Drop a pool whose worker died; the next start_enrollment_pool() makes a new one."""
+    global _enroll_pool
+    with _enroll_pool_lock:
+        if _enroll_pool is pool:
+            _enroll_pool = None
+    pool.shutdown(wait=False)
+
+
+def _extract_for_enrollment(audio_path: str):
+    """Worker: (feature_vector, None) on success, (None, error message) on failure."""
+    try:
+        feature_vector = extract_features(audio_path)
+    except Exception as e:
+        return None, str(e)
+    if feature_vector is None:
+        return None, "no features extracted (no vocalization, or audio empty/corrupt)"
+    return feature_vector, None
+
+
+def _extract_isolated(paths: List[str]) -> List[Tuple[Any, Optional[str]]]:
+    """
+    Re-run clips whose pool crashed, one at a time in a single-worker pool,
+    so only the clip that actually kills its worker is reported as failed.
+    """
+    results = []
+    executor = None
+    for path in paths:
+        if executor is None:
+            executor = ProcessPoolExecutor(max_workers=1, mp_context=ENROLL_MP_CONTEXT)
+        try:
+            results.append(executor.submit(_extract_for_enrollment, path).result())
+        except BrokenProcessPool:
+            results.append((None, "worker process crashed while extracting features"))
+            executor.shutdown(wait=False)
+            executor = None
+    if executor is not None:
+        executor.shutdown()
+    return results
+
+
+def add_user_phrases_from_audio_paths(
+    user_id: str,
+    items: List[Tuple[str, str]],
+    db_path: str = DEFAULT_DB_PATH,
+    max_workers: Optional[int] = None,
+    use_processes: bool = True,
+    dedup_threshold: Optional[float] = None,
+    max_prototypes_per_label: Optional[int] = None,
+) -> Dict[str, Any]:
+    """
+    Bulk enrollment:
+    - items: list of (audio_path, label)
+    - features are extracted in parallel: in the shared process pool by default,
+      since pYIN is CPU-bound (use_processes=False switches to a thread pool of
+      max_workers threads)
+    - all successful clips are committed to the DB in a single write
+    - a failing clip is reported, it does not abort the batch
+    Returns {"added": int, "failed": [{"audio_path", "label", "error"}], "total_examples": int}
+    """
+    paths = [audio_path for audio_path, _ in items]
+
+    if use_processes:
+        executor = start_enrollment_pool()
+    else:
+        executor = ThreadPoolExecutor(max_workers=max_workers)
+
+    results = []
+    try:
+        futures = [executor.submit(_extract_for_enrollment, path) for path in paths]
+    except BrokenProcessPool:
+        # broken by another batch since it was handed out
+        futures = []
+        results = [None] * len(paths)
+    for future in futures:
+        try:
+            results.append(future.result())
+        except BrokenProcessPool:
+            # a worker died (e.g. segfault / OOM in native code); retried below
+            results.append(None)
+
+    if use_processes:
+        if any(result is None for result in results):
+            _discard_broken_pool(executor)
+    else:
+        executor.shutdown()
+
+    crashed = [i for i, result in enumerate(results) if result is None]
+    if crashed:
+        for i, result in zip(crashed, _extract_isolated([paths[i] for i in crashed])):
+            results[i] = result
+
+    enrolled, failed = [], []
+    for (audio_path, label), (feature_vector, error) in zip(items, results):
+        if error is None:
+            enrolled.append((feature_vector, label))
+        else:
+            failed.append({"audio_path": audio_path, "label": label, "error": error})
+            print(f"❌ Skipped {audio_path}: {error}")
+
+    if enrolled:
+        total = add_user_phrases(
+            user_id,
+            enrolled,
+            db_path=db_path,
+            dedup_threshold=dedup_threshold,
+            max_prototypes_per_label=max_prototypes_per_label,
+        )
+    else:
+        total = len(load_user_db(db_path).get(user_id, []))
+
+    return {"added": len(enrolled), "failed": failed, "total_examples": total}
+
+
 def predict_phrase_from_audio_path(
     user_id: str,
     audio_path: str,
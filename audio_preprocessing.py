@@ -17,6 +17,50 @@ PROJECT_ID = "peak-apparatus-479108-f5"
 BUCKET_NAME = "voicedata-csv"
 DESTINATION_FOLDER = "ReCANVo/"
 
+# --- Voice-Activity Gate ---
+# Cheap energy / zero-crossing check run on the raw (un-normalized) signal
+# BEFORE resampling, MFCC and pYIN. Clips that fail it are treated as
+# "no vocalization" and skip the expensive feature pipeline.
+# Opt-in (vad=True) and only used on the inference path: training / upload
+# keep every recording, including quiet ones below the absolute thresholds.
+VAD_FRAME_SECONDS = 0.025     # analysis frame length
+VAD_MIN_RMS = 0.01            # ~ -40 dBFS; quieter frames count as silence
+VAD_MAX_ZCR = 0.35            # zero crossings per sample; broadband hiss is ~0.5
+VAD_MIN_ACTIVE_SECONDS = 0.15 # total active frames needed to count as a vocalization
+VAD_MIN_TRIMMED_SAMPLES = 2048  # after trim, shorter than one FFT frame = nothing left
+
+# Per-process counts. Each API worker process keeps its own; anything gated in
+# a child process (e.g. a ProcessPoolExecutor) is not reflected here.
+vad_counters = {"checked": 0, "passed": 0, "rejected_silent": 0, "rejected_trimmed": 0}
+
+def has_vocalization(
+    y: np.ndarray,
+    sr: int,
+    min_rms: float = None,
+    max_zcr: float = None,
+    min_active_seconds: float = None,
+) -> bool:
+    """
+    True if enough frames are both loud enough and not noise-like.
+    Thresholds default to the VAD_* module constants.
+    """
+    min_rms = VAD_MIN_RMS if min_rms is None else min_rms
+    max_zcr = VAD_MAX_ZCR if max_zcr is None else max_zcr
+    min_active_seconds = VAD_MIN_ACTIVE_SECONDS if min_active_seconds is None else min_active_seconds
+
+    frame_len = max(1, int(sr * VAD_FRAME_SECONDS))
+    n_frames = len(y) // frame_len
+    if n_frames == 0:
+        return False
+
+    # non-overlapping frames: a reshape, no copy for contiguous input
+    frames = np.asarray(y[:n_frames * frame_len], dtype=np.float32).reshape(n_frames, frame_len)
+    rms = np.sqrt(np.mean(frames * frames, axis=1))
+    zcr = np.mean(np.signbit(frames[:, 1:]) != np.signbit(frames[:, :-1]), axis=1)
+
+    active = (rms >= min_rms) & (zcr <= max_zcr)
+    return np.count_nonzero(active) * frame_len >= min_active_seconds * sr
+
 # --- Preprocessing Logic ---
 def _basic_denoise(y: np.ndarray, sr: int) -> np.ndarray:
     """Applies a high-pass Butterworth filter for basic noise reduction."""
@@ -26,28 +70,50 @@ def _basic_denoise(y: np.ndarray, sr: int) -> np.ndarray:
     b, a = butter(5, normalized_cutoff, btype='highpass', analog=False)
     return lfilter(b, a, y)
 
-def normalize_and_trim(audio_path: str, sr: int = SR) -> tuple[np.ndarray, int]:
+def preprocess_array(y: np.ndarray, original_sr: int, sr: int = SR, vad: bool = False) -> tuple[np.ndarray, int]:
     """
-    Loads audio, normalizes volume, trims silence, and denoises.
+    Normalizes volume, trims silence, and denoises an already-decoded mono signal.
+    Skips resampling when the signal is already at the target rate.
+    With vad=True, returns an empty array (-> "no vocalization") if the clip
+    fails the voice-activity gate or is (almost) empty after trimming.
     """
-    try:
-        # Load with original SR first
-        y, original_sr = librosa.load(audio_path, sr=None)
+    if vad:
+        vad_counters["checked"] += 1
+        if not has_vocalization(y, original_sr):
+            vad_counters["rejected_silent"] += 1
+            return np.array([]), sr
 
-        # Resample if necessary
-        if original_sr != sr:
-            y = librosa.resample(y, orig_sr=original_sr, target_sr=sr)
+    # Resample if necessary
+    if original_sr != sr:
+        y = librosa.resample(y, orig_sr=original_sr, target_sr=sr)
 
-        # Normalize (Volume)
-        y = librosa.util.normalize(y)
+    # Normalize (Volume)
+    y = librosa.util.normalize(y)
 
-        # Trim Silence (Top 20dB)
-        y_trimmed, _ = librosa.effects.trim(y, top_db=20)
+    # Trim Silence (Top 20dB)
+    y_trimmed, _ = librosa.effects.trim(y, top_db=20)
 
-        # Denoise
-        y_filtered = _basic_denoise(y_trimmed, sr)
+    if vad:
+        if y_trimmed.size < VAD_MIN_TRIMMED_SAMPLES:
+            vad_counters["rejected_trimmed"] += 1
+            return np.array([]), sr
+        vad_counters["passed"] += 1
+
+    # Denoise
+    y_filtered = _basic_denoise(y_trimmed, sr)
+
+    return y_filtered, sr
+
+def normalize_and_trim(audio_path: str, sr: int = SR, vad: bool = False) -> tuple[np.ndarray, int]:
+    """
+    Loads audio, normalizes volume, trims silence, and denoises.
+    vad=True applies the voice-activity gate (inference only, see above).
+    """
+    try:
+        # Load with original SR first
+        y, original_sr = librosa.load(audio_path, sr=None)
 
-        return y_filtered, sr
+        return preprocess_array(y, original_sr, sr, vad=vad)
 
     except Exception as e:
         print(f"Error loading {audio_path}: {e}")
@@ -1,11 +1,13 @@
 # emotion_inference.py
 
 import io
+import struct
 import numpy as np
 import joblib
 import soundfile as sf
 
-from feature_extraction import extract_features
+from feature_extraction import extract_features, extract_features_from_array
+from model_registry import ModelRegistry
 
 # paths to Module 2 artifacts
 BASE_DIR = r"C:\Users\rohan\OneDrive\Desktop\Datathon\models"
@@ -16,9 +18,72 @@ SCALER_PATH = BASE_DIR + r"\scaler.pkl"
 emotion_model = joblib.load(MODEL_PATH)
 scaler = joblib.load(SCALER_PATH)
 
-def predict_emotion_from_audio_bytes(audio_bytes: bytes):
+# per-user / per-cohort models: <USER_MODELS_DIR>/<key>/emotion_model.pkl + scaler.pkl
+# loaded on demand, LRU-bounded, falling back to the global pair above
+USER_MODELS_DIR = BASE_DIR + r"\users"
+model_registry = ModelRegistry(USER_MODELS_DIR, fallback=(emotion_model, scaler))
+
+# Compact raw-PCM upload format:
+#   bytes 0-3  magic b"OMPC"
+#   bytes 4-7  sample rate, uint32 little-endian (ideally 22050 = pipeline SR)
+#   bytes 8-   mono int16 little-endian samples
+PCM_MAGIC = b"OMPC"
+PCM_HEADER = struct.Struct("<4sI")
+# declared rates outside this range are rejected: a tiny rate on a big body would
+# be upsampled into hours of audio before pYIN runs
+PCM_MIN_RATE = 8000
+PCM_MAX_RATE = 96000
+
+# returned instead of a model label when the voice-activity gate rejects the clip
+NO_VOCALIZATION = "no_vocalization"
+# gate silent / noise-only uploads before MFCC + pYIN (see audio_preprocessing)
+USE_VAD = True
+
+
+def is_pcm_upload(audio_bytes: bytes) -> bool:
+    """True if the payload starts with the raw-PCM header instead of a WAV/other container."""
+    return audio_bytes[:len(PCM_MAGIC)] == PCM_MAGIC
+
+
+def decode_pcm_upload(audio_bytes: bytes):
+    """
+    Parse a raw-PCM upload into (int16 samples, sample_rate).
+    The samples are a zero-copy view over audio_bytes.
+    """
+    if len(audio_bytes) < PCM_HEADER.size:
+        raise ValueError("PCM upload is shorter than its header")
+    magic, sr = PCM_HEADER.unpack_from(audio_bytes)
+    if magic != PCM_MAGIC:
+        raise ValueError("PCM upload has a bad magic header")
+    if not PCM_MIN_RATE <= sr <= PCM_MAX_RATE:
+        raise ValueError(
+            f"PCM upload declares sample rate {sr}; expected {PCM_MIN_RATE}-{PCM_MAX_RATE} Hz"
+        )
+    if (len(audio_bytes) - PCM_HEADER.size) % 2 != 0:
+        raise ValueError("PCM payload length is not a multiple of 2 bytes (int16)")
+
+    samples = np.frombuffer(audio_bytes, dtype="<i2", offset=PCM_HEADER.size)
+    return samples, sr
+
+
+def pcm_features(audio_bytes: bytes) -> np.ndarray:
+    """
+    Fast path for raw-PCM uploads: no soundfile decode, no temp file, and no
+    resampling when the client already sends at the pipeline rate.
+    """
+    samples, sr = decode_pcm_upload(audio_bytes)
+    # same scaling soundfile/librosa use when reading 16-bit WAV
+    data = samples.astype(np.float32) / np.float32(32768.0)
+
+    return extract_features_from_array(data, sr, vad=USE_VAD)
+
+
+def audio_file_features(audio_bytes: bytes) -> np.ndarray:
     # write bytes to buffer and read with soundfile
-    data, sr = sf.read(io.BytesIO(audio_bytes))
+    try:
+        data, sr = sf.read(io.BytesIO(audio_bytes))
+    except RuntimeError as e:  # soundfile's decode errors subclass RuntimeError
+        raise ValueError(f"could not decode audio upload: {e}") from e
     # if stereo, make mono
     if data.ndim > 1:
         data = np.mean(data, axis=1)
@@ -38,19 +103,54 @@ def predict_emotion_from_audio_bytes(audio_bytes: bytes):
         temp_path = tmp.name
 
     try:
-        feature_vector = extract_features(temp_path).reshape(1, -1)
+        return extract_features(temp_path, vad=USE_VAD)
     finally:
         if os.path.exists(temp_path):
             os.remove(temp_path)
 
+
+def features_from_upload(audio_bytes: bytes) -> np.ndarray:
+    """
+    Feature vector for any upload: raw PCM (OMPC header) or an encoded file.
+    Returns None when the clip has no vocalization (silent / noise only /
+    nothing left after trimming).
+    """
+    if is_pcm_upload(audio_bytes):
+        return pcm_features(audio_bytes)
+    return audio_file_features(audio_bytes)
+
+
+def predict_emotion_from_pcm_bytes(audio_bytes: bytes, user_id: str = None, cohort: str = None):
+    feature_vector = pcm_features(audio_bytes)
+    if feature_vector is None:
+        return NO_VOCALIZATION, 0.0
+    return predict_emotion_from_features(feature_vector, user_id=user_id, cohort=cohort)
+
+
+def predict_emotion_from_audio_bytes(audio_bytes: bytes, user_id: str = None, cohort: str = None):
+    feature_vector = audio_file_features(audio_bytes)
+    if feature_vector is None:
+        return NO_VOCALIZATION, 0.0
+    return predict_emotion_from_features(feature_vector, user_id=user_id, cohort=cohort)
+
+
+def predict_emotion_from_features(feature_vector: np.ndarray, user_id: str = None, cohort: str = None):
+    """
+    Scale an already-extracted feature vector and run the emotion model on it.
+    Lets callers reuse one extraction for several consumers.
+    Uses the user's (or cohort's) adapted model when one exists, else the global one.
+    """
+    model, model_scaler = model_registry.get(user_id, cohort)
+    feature_vector = np.asarray(feature_vector).reshape(1, -1)
+
     # scale + predict
-    feature_scaled = scaler.transform(feature_vector)
-    pred_label = emotion_model.predict(feature_scaled)[0]
+    feature_scaled = model_scaler.transform(feature_vector)
+    pred_label = model.predict(feature_scaled)[0]
 
     # optional: confidence
-    if hasattr(emotion_model, "predict_proba"):
-        proba = emotion_model.predict_proba(feature_scaled)[0]
-        class_idx = list(emotion_model.classes_).index(pred_label)
+    if hasattr(model, "predict_proba"):
+        proba = model.predict_proba(feature_scaled)[0]
+        class_idx = list(model.classes_).index(pred_label)
         confidence = float(proba[class_idx])
     else:
         confidence = 0.0
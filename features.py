@@ -5,12 +5,18 @@ import os
 import tempfile
 from pathlib import Path
 from google.cloud import storage # Import GCS library
-from audio_preprocessing import normalize_and_trim, SR
+from audio_preprocessing import normalize_and_trim, preprocess_array, SR
+from frame_cache import (
+    build_frame_matrix, save_frames, agg_mean_std, is_cached, DEFAULT_CACHE_DIR,
+    read_cache_meta, check_cache_meta, LAYOUT_VERSION,
+)
 
 # --- Configuration Constants ---
 N_MFCC = 40
 N_FFT = 2048
 HOP_LENGTH = 512
+# recorded with cached frame matrices; a cache built with other values is refused
+FRAME_PARAMS = {"sr": SR, "n_fft": N_FFT, "hop_length": HOP_LENGTH, "n_mfcc": N_MFCC}
 
 # ⚠️ UPDATE THIS WITH YOUR ACTUAL BUCKET NAME
 BUCKET_NAME = "voicedata-csv"
@@ -18,14 +24,53 @@ PROJECT_ID = "peak-apparatus-479108-f5"
 # Folder prefix inside the bucket (e.g., "ReCANVo/"). Leave empty "" if files are at root.
 BUCKET_PREFIX = "ReCANVo/"
 
-def extract_features(audio_path: str) -> np.ndarray:
+def extract_features(audio_path: str, frame_cache_dir: str = None, cache_key: str = None,
+                     vad: bool = False) -> np.ndarray:
     """
     Extracts purely technical features: MFCCs, Pitch, and Energy.
+    vad=True (inference only) returns None for silent / noise-only clips
+    without running MFCC / pYIN.
+    If frame_cache_dir is set, the frame-level matrix is also saved there
+    (under cache_key, default audio_path) so new aggregates can be built later
+    with frame_cache.build_feature_csv_from_cache() without touching audio.
     """
     # 1. Preprocess the audio
     # audio_path here will be a temporary local path to the downloaded file
-    y_trimmed, sr = normalize_and_trim(audio_path, SR)
+    y_trimmed, sr = normalize_and_trim(audio_path, SR, vad=vad)
 
+    frames = _frames_from_preprocessed(y_trimmed, sr)
+    if frames is None:
+        return None
+
+    if frame_cache_dir is not None:
+        save_frames(frame_cache_dir, cache_key or audio_path, frames, FRAME_PARAMS)
+
+    # 5. Feature Aggregation
+    return np.array(agg_mean_std(frames))
+
+def extract_features_from_array(y: np.ndarray, sr: int, vad: bool = False) -> np.ndarray:
+    """
+    Same features as extract_features(), but for a mono signal that is already
+    in memory (e.g. raw PCM uploads). No file round-trip, no decoding.
+    """
+    try:
+        y_trimmed, sr = preprocess_array(y, sr, SR, vad=vad)
+    except Exception as e:
+        print(f"Error preprocessing array: {e}")
+        return None
+
+    frames = _frames_from_preprocessed(y_trimmed, sr)
+    if frames is None:
+        return None
+
+    # 5. Feature Aggregation
+    return np.array(agg_mean_std(frames))
+
+def _frames_from_preprocessed(y_trimmed: np.ndarray, sr: int) -> np.ndarray:
+    """
+    Runs MFCC / RMS / pYIN on a preprocessed signal and returns the
+    frame-level matrix (layout in frame_cache.py), or None if the signal is empty.
+    """
     if y_trimmed.size == 0:
         return None
 
@@ -49,30 +94,20 @@ def extract_features(audio_path: str) -> np.ndarray:
         hop_length=HOP_LENGTH
     )
 
-    # 5. Feature Aggregation
-    aggregated_features = []
-
-    # MFCCs: Mean and Std
-    for coeff in mfccs:
-        aggregated_features.extend([np.mean(coeff), np.std(coeff)])
-
-    # Energy: Mean and Std
-    aggregated_features.extend([np.mean(rms), np.std(rms)])
+    return build_frame_matrix(mfccs, rms, f0, voiced_flag, voiced_probs)
 
-    # Pitch: Mean and Std
-    f0_valid = f0[~np.isnan(f0)]
-    if len(f0_valid) > 0:
-        aggregated_features.extend([np.mean(f0_valid), np.std(f0_valid)])
-    else:
-        aggregated_features.extend([0.0, 0.0])
-
-    return np.array(aggregated_features)
-
-def process_gcs_blobs(blob_list: list) -> list:
+def process_gcs_blobs(blob_list: list, frame_cache_dir: str = None) -> list:
     """
     Helper: Downloads GCS blobs to temp files, extracts features, and returns rows.
     FIXED for Windows: Closes the file handle before Librosa tries to read it.
+    If frame_cache_dir is set, frame-level matrices are cached per blob name.
+    Raises ValueError up front if that cache was built with other settings.
     """
+    if frame_cache_dir is not None:
+        meta = read_cache_meta(frame_cache_dir)
+        if meta is not None:
+            check_cache_meta(frame_cache_dir, meta, {"layout_version": LAYOUT_VERSION, **FRAME_PARAMS})
+
     processed_rows = []
     print(f"Processing {len(blob_list)} files from Cloud Storage...")
 
@@ -91,7 +126,9 @@ def process_gcs_blobs(blob_list: list) -> list:
                 blob.download_to_filename(temp_filename)
 
             # 2. File is now closed, so Librosa can safely open it
-            feature_vector = extract_features(temp_filename)
+            feature_vector = extract_features(
+                temp_filename, frame_cache_dir=frame_cache_dir, cache_key=blob.name
+            )
 
             if feature_vector is not None:
                 row = {'filepath': blob.name}
@@ -112,7 +149,8 @@ def process_gcs_blobs(blob_list: list) -> list:
 
     return processed_rows
 
-def update_feature_csv_from_cloud(bucket_name: str, prefix: str, csv_path: str = 'features.csv'):
+def update_feature_csv_from_cloud(bucket_name: str, prefix: str, csv_path: str = 'features.csv',
+                                  frame_cache_dir: str = None):
     """
     Smart updater: Connects to GCS, checks against local CSV, downloads & processes ONLY new files.
     """
@@ -155,7 +193,7 @@ def update_feature_csv_from_cloud(bucket_name: str, prefix: str, csv_path: str =
         return
 
     # 5. Process the new blobs
-    new_data = process_gcs_blobs(new_blobs)
+    new_data = process_gcs_blobs(new_blobs, frame_cache_dir=frame_cache_dir)
 
     # 6. Save/Append to CSV
     if new_data:
@@ -172,6 +210,33 @@ def update_feature_csv_from_cloud(bucket_name: str, prefix: str, csv_path: str =
     else:
         print("❌ No features extracted from new files.")
 
+def backfill_frame_cache(bucket_name: str, prefix: str, frame_cache_dir: str = DEFAULT_CACHE_DIR):
+    """
+    One-off: cache frame matrices for EVERY .wav in the bucket that isn't cached yet,
+    including clips already in features.csv (update_feature_csv_from_cloud only
+    sees new clips). features.csv is not touched.
+    """
+    try:
+        storage_client = storage.Client(project=PROJECT_ID)
+        bucket = storage_client.bucket(bucket_name)
+        print(f"Connected to GCS Bucket: {bucket_name}")
+    except Exception as e:
+        print(f"❌ Failed to connect to GCS. Run 'gcloud auth application-default login'. Error: {e}")
+        return
+
+    blobs = list(bucket.list_blobs(prefix=prefix))
+    todo = [
+        b for b in blobs
+        if b.name.lower().endswith('.wav') and not is_cached(frame_cache_dir, b.name)
+    ]
+
+    if not todo:
+        print(f"✅ Frame cache in '{frame_cache_dir}' already covers every clip.")
+        return
+
+    rows = process_gcs_blobs(todo, frame_cache_dir=frame_cache_dir)
+    print(f"✅ Cached frames for {len(rows)} of {len(todo)} uncached clips in '{frame_cache_dir}'")
+
 if __name__ == '__main__':
     # --- EXECUTION ---
     # Ensure you have run 'gcloud auth application-default login' in your terminal first!
@@ -0,0 +1,244 @@
+import os
+import json
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+from urllib.parse import quote, unquote
+
+# --- Frame matrix layout ---
+# One row per analysis frame (hop = features.HOP_LENGTH), columns:
+#   RMS_COL            RMS energy
+#   F0_COL             pYIN F0 in Hz (NaN when unvoiced)
+#   VOICED_FLAG_COL    pYIN voiced flag (0.0 / 1.0)
+#   VOICED_PROB_COL    pYIN voiced probability
+#   [MFCC_START, end)  MFCC coefficients (as many as the extractor produced)
+RMS_COL = 0
+F0_COL = 1
+VOICED_FLAG_COL = 2
+VOICED_PROB_COL = 3
+MFCC_START = 4
+LAYOUT_COLUMNS = ["rms", "f0", "voiced_flag", "voiced_prob", "mfcc..."]
+# bump when the column layout changes; caches written with another layout are refused
+LAYOUT_VERSION = 2
+
+DEFAULT_CACHE_DIR = "frame_cache"
+# per-cache metadata: layout + the extraction params the frames were computed with
+META_FILENAME = "cache_meta.json"
+
+
+def build_frame_matrix(mfccs, rms, f0, voiced_flag, voiced_probs) -> np.ndarray:
+    """
+    Stack librosa outputs (features-first) into one
+    (n_frames, MFCC_START + mfccs.shape[0]) matrix.
+    """
+    n_frames = min(mfccs.shape[1], rms.shape[-1], len(f0))
+    return np.column_stack([
+        rms.reshape(-1)[:n_frames],
+        f0[:n_frames],
+        np.asarray(voiced_flag[:n_frames], dtype=float),
+        voiced_probs[:n_frames],
+        mfccs[:, :n_frames].T,
+    ])
+
+
+def n_mfcc_of(frames: np.ndarray) -> int:
+    return frames.shape[1] - MFCC_START
+
+
+# --- Cache metadata (one cache_meta.json per cache_dir) ---
+
+def _cache_meta(frames: np.ndarray, params: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        **params,
+        "layout_version": LAYOUT_VERSION,
+        "columns": LAYOUT_COLUMNS,
+        "n_mfcc": n_mfcc_of(frames),  # actual width, whatever the extractor was asked for
+    }
+
+
+def read_cache_meta(cache_dir: str) -> Optional[Dict[str, Any]]:
+    path = Path(cache_dir) / META_FILENAME
+    if not path.exists():
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def check_cache_meta(cache_dir: str, meta: Optional[Dict[str, Any]], expected: Dict[str, Any]) -> None:
+    """Raise ValueError if the cache's metadata doesn't match the expected layout / params."""
+    if meta is None:
+        raise ValueError(
+            f"{cache_dir} has no {META_FILENAME} (written by an older version?); rebuild the cache"
+        )
+    mismatched = {
+        key: (meta.get(key), value) for key, value in expected.items() if meta.get(key) != value
+    }
+    if mismatched:
+        details = ", ".join(f"{k}: cached {old!r}, expected {new!r}" for k, (old, new) in mismatched.items())
+        raise ValueError(f"frame cache {cache_dir} was built with different settings ({details})")
+
+
+def _write_cache_meta(cache_dir: str, meta: Dict[str, Any]) -> None:
+    path = Path(cache_dir) / META_FILENAME
+    tmp_path = path.with_suffix(".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(meta, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+# --- Cache I/O (one .npy per clip) ---
+
+def _cache_path(cache_dir: str, cache_key: str) -> Path:
+    # blob names like "ReCANVo/clip.wav" -> "ReCANVo%2Fclip.wav.npy" (reversible)
+    return Path(cache_dir) / f"{quote(cache_key, safe='')}.npy"
+
+
+def save_frames(cache_dir: str, cache_key: str, frames: np.ndarray, params: Dict[str, Any]) -> None:
+    """
+    Persist a clip's frame matrix (written to a temp file, then renamed).
+    params are the extraction settings (sr, n_fft, hop_length, ...). The first
+    save records them in cache_meta.json; later saves must match them.
+    """
+    path = _cache_path(cache_dir, cache_key)
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    meta = _cache_meta(frames, params)
+    existing = read_cache_meta(cache_dir)
+    if existing is None:
+        _write_cache_meta(cache_dir, meta)
+    else:
+        check_cache_meta(cache_dir, existing, meta)
+
+    tmp_path = path.with_suffix(".tmp.npy")
+    np.save(tmp_path, frames)
+    os.replace(tmp_path, path)
+
+
+def is_cached(cache_dir: str, cache_key: str) -> bool:
+    return _cache_path(cache_dir, cache_key).exists()
+
+
+def load_frames(cache_dir: str, cache_key: str) -> Optional[np.ndarray]:
+    """Memory-mapped frame matrix for a clip, or None if it was never cached."""
+    path = _cache_path(cache_dir, cache_key)
+    if not path.exists():
+        return None
+    return np.load(path, mmap_mode="r")
+
+
+def iter_cached_frames(cache_dir: str = DEFAULT_CACHE_DIR, params: Optional[Dict[str, Any]] = None):
+    """
+    Yields (cache_key, memory-mapped frame matrix) for every cached clip.
+    Raises ValueError first if the cache was written with another layout or
+    other extraction params (default: the current ones from features.py).
+    """
+    if params is None:
+        from features import FRAME_PARAMS as params  # features imports this module
+    expected = {"layout_version": LAYOUT_VERSION, **params}
+    check_cache_meta(cache_dir, read_cache_meta(cache_dir), expected)
+
+    for path in sorted(Path(cache_dir).glob("*.npy")):
+        if path.name.endswith(".tmp.npy"):
+            continue
+        cache_key = unquote(path.name[:-len(".npy")])
+        yield cache_key, np.load(path, mmap_mode="r")
+
+
+# --- Aggregators: frame matrix -> 1D feature block ---
+
+def _mean_std(x: np.ndarray) -> List[float]:
+    return [np.mean(x), np.std(x)] if len(x) > 0 else [0.0, 0.0]
+
+
+def agg_mean_std(frames: np.ndarray) -> List[float]:
+    """
+    The original Module 1 feature set (84 values): MFCC mean/std pairs,
+    RMS mean/std, voiced-F0 mean/std.
+    """
+    out = []
+    for c in range(MFCC_START, frames.shape[1]):
+        out.extend([np.mean(frames[:, c]), np.std(frames[:, c])])
+    out.extend([np.mean(frames[:, RMS_COL]), np.std(frames[:, RMS_COL])])
+    f0 = frames[:, F0_COL]
+    out.extend(_mean_std(f0[~np.isnan(f0)]))
+    return out
+
+
+def agg_mfcc_delta(frames: np.ndarray) -> List[float]:
+    """Mean/std of first-order frame-to-frame MFCC differences."""
+    deltas = np.diff(frames[:, MFCC_START:], axis=0)
+    out = []
+    for c in range(deltas.shape[1]):
+        out.extend(_mean_std(deltas[:, c]))
+    return out
+
+
+def agg_percentiles(frames: np.ndarray, q=(10, 50, 90)) -> List[float]:
+    """Percentiles of RMS and voiced F0."""
+    out = list(np.percentile(frames[:, RMS_COL], q))
+    f0 = frames[:, F0_COL]
+    f0_valid = f0[~np.isnan(f0)]
+    out.extend(np.percentile(f0_valid, q) if len(f0_valid) > 0 else [0.0] * len(q))
+    return out
+
+
+def agg_voiced_ratio(frames: np.ndarray) -> List[float]:
+    """Fraction of voiced frames and mean voicing probability."""
+    if len(frames) == 0:
+        return [0.0, 0.0]
+    return [
+        float(np.mean(frames[:, VOICED_FLAG_COL])),
+        float(np.nanmean(frames[:, VOICED_PROB_COL])),
+    ]
+
+
+AGGREGATORS: Dict[str, Callable[[np.ndarray], List[float]]] = {
+    "mean_std": agg_mean_std,
+    "mfcc_delta": agg_mfcc_delta,
+    "percentiles": agg_percentiles,
+    "voiced_ratio": agg_voiced_ratio,
+}
+
+
+def aggregate(frames: np.ndarray, aggregators=("mean_std",)) -> np.ndarray:
+    """Concatenate the named aggregators' outputs into one feature vector."""
+    out = []
+    for name in aggregators:
+        out.extend(AGGREGATORS[name](frames))
+    return np.array(out)
+
+
+def build_feature_csv_from_cache(
+    cache_dir: str = DEFAULT_CACHE_DIR,
+    csv_path: str = "features_from_cache.csv",
+    aggregators=("mean_std",),
+    params: Optional[Dict[str, Any]] = None,
+) -> pd.DataFrame:
+    """
+    Build a Module 2 training table straight from cached frames: no audio
+    decoding, no pYIN. Output has the same shape as features.csv
+    ('filepath' + 'feature_i' columns), so it can be labeled and fed to
+    Module2.py unchanged. Refuses a cache built with other extraction params
+    (see iter_cached_frames).
+    """
+    rows = []
+    for cache_key, frames in iter_cached_frames(cache_dir, params):
+        row = {'filepath': cache_key}
+        for i, val in enumerate(aggregate(frames, aggregators)):
+            row[f'feature_{i}'] = val
+        rows.append(row)
+
+    df = pd.DataFrame(rows)
+    df.to_csv(csv_path, index=False)
+    print(f"✅ Wrote {len(df)} rows ({'+'.join(aggregators)}) to {csv_path}")
+    return df
+
+
+if __name__ == '__main__':
+    # e.g. try a richer feature set for Module 2 without touching any audio
+    build_feature_csv_from_cache(
+        DEFAULT_CACHE_DIR,
+        "features_from_cache.csv",
+        aggregators=("mean_std", "mfcc_delta", "percentiles", "voiced_ratio"),
+    )
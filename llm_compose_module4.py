@@ -1,5 +1,5 @@
 # llm_compose.py
-from typing import List, Tuple
+from typing import List, Optional, Tuple
 
 # Optional: map icon IDs to nicer phrases
 ID_TO_PHRASE = {
@@ -25,12 +25,27 @@ def choices_to_text(choices: List[str]) -> str:
     return ", ".join(phrases[:-1]) + " and " + phrases[-1]
 
 
-def generate_sentence(emotion: str, choices: List[str]) -> str:
+def phrase_to_text(phrase: str) -> str:
+    """Turn a personalization label ("i_am_hungry", "I'm hungry.") into sentence text."""
+    text = phrase.replace("_", " ").strip().rstrip(".!?")
+    return text[:1].upper() + text[1:]
+
+
+def generate_sentence(emotion: str, choices: List[str], phrase: Optional[str] = None) -> str:
     """
     Compose a simple first-person sentence based on:
     - detected emotion (e.g. "happy", "distressed", "sad")
     - selected icon IDs (e.g. ["home", "pizza", "mom"])
+    - optional personalized phrase matched from the user's own vocalizations
+      (e.g. "i_am_hungry"), said first
     """
+    sentence = _emotion_sentence(emotion, choices)
+    if phrase:
+        return f"{phrase_to_text(phrase)}. {sentence}"
+    return sentence
+
+
+def _emotion_sentence(emotion: str, choices: List[str]) -> str:
     emo = emotion.lower()
     what_i_want = choices_to_text(choices)
 
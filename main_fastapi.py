@@ -1,21 +1,48 @@
 # main_fastapi.py
 
-from fastapi import FastAPI, UploadFile, File
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import StreamingResponse
+from contextlib import asynccontextmanager
 from pydantic import BaseModel
 from typing import List, Optional
 import io
+import os
+import base64
+import tempfile
+import time
 
-from emotional_interface_module2 import predict_emotion_from_audio_bytes
+from emotional_interface_module2 import (
+    predict_emotion_from_features,
+    features_from_upload,
+    model_registry,
+)
+from model_registry import InvalidModelKey
+from audio_preprocessing import vad_counters
+from request_profiler import ProfilingMiddleware
+from Module3_personalize import (
+    predict_phrase,
+    add_user_phrases_from_audio_paths,
+    start_enrollment_pool,
+    shutdown_enrollment_pool,
+)
 from llm_compose_module4 import generate_sentence, synthesize_speech
 
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # one bounded worker pool for bulk enrollment, shared by all requests
+    start_enrollment_pool()
+    yield
+    shutdown_enrollment_pool()
+
 
 app = FastAPI(
     title="AAC Emotion Communication API",
     description="Audio → emotion + icons → spoken sentence.",
     version="0.1.0",
+    lifespan=lifespan,
 )
 
 app.add_middleware(
@@ -27,24 +54,79 @@ app.add_middleware(
 )
 
 
+# Opt-in per-request profiling (see request_profiler.py): off unless the server
+# sets PROFILE_TOKEN (client sends X-Profile + X-Profile-Token) or PROFILE_SAMPLE_RATE.
+# Only the event-loop thread is profiled: /analyze-emotion and /analyze-and-compose
+# extract features there and are covered; bulk enrollment runs in a thread / process
+# pool and is not. Concurrent requests' work on the loop is charged to the profiled one.
+app.add_middleware(ProfilingMiddleware)
+
+
 # ---------- 1) Emotion analysis from audio ----------
 
 @app.post("/analyze-emotion")
-async def analyze_emotion(file: UploadFile = File(...)):
+async def analyze_emotion(
+    file: UploadFile = File(...),
+    user_id: Optional[str] = Form(default=None),
+    cohort: Optional[str] = Form(default=None),
+):
     """
     Frontend uploads recorded audio.
     Backend returns detected emotion + confidence.
+
+    Accepts either an encoded file (WAV etc.) or the compact raw-PCM format
+    (b"OMPC" + uint32 sample rate + mono int16 samples), which skips decoding.
+    If user_id / cohort is given, that user's adapted model is used when available.
+    Silent / noise-only clips are not classified: "vocalization" is false,
+    "raw_emotion" is None and "emotion" is "neutral".
     """
     audio_bytes = await file.read()
-    raw_label, confidence = predict_emotion_from_audio_bytes(audio_bytes)
+    try:
+        feature_vector = features_from_upload(audio_bytes)
+    except ValueError as e:  # malformed / undecodable upload
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if feature_vector is None:
+        return {
+            "raw_emotion": None,
+            "emotion": NO_VOCALIZATION_EMOTION,
+            "confidence": 0.0,
+            "vocalization": False,
+        }
+
+    try:
+        raw_label, confidence = predict_emotion_from_features(feature_vector, user_id, cohort)
+    except InvalidModelKey as e:
+        raise HTTPException(status_code=400, detail=str(e))
     simple_label = map_to_simple_emotion(raw_label)
     return {
         "raw_emotion": raw_label,
         "emotion": simple_label,
         "confidence": confidence,
+        "vocalization": True,
     }
 
 
+@app.get("/models/stats")
+async def model_stats():
+    """Per-user model registry: resident models, load / eviction / swap counters."""
+    return model_registry.stats()
+
+
+@app.get("/vad/stats")
+async def vad_stats():
+    """
+    Voice-activity gate: uploads checked / passed / rejected as silent or empty.
+    Counts are for this worker process only (run several workers -> query each).
+    """
+    return dict(vad_counters)
+
+
+# "emotion" reported for clips the voice-activity gate rejects; the gate itself
+# is reported as vocalization=false, so /compose-and-speak keeps getting a real emotion
+NO_VOCALIZATION_EMOTION = "neutral"
+
+
 def map_to_simple_emotion(raw_label: str) -> str:
     rl = raw_label.lower()
 
@@ -83,3 +165,146 @@ async def compose_and_speak(body: ComposeRequest):
         media_type=mime_type,
         headers={"Content-Disposition": 'inline; filename="output.wav"'},
     )
+
+
+# ---------- 3) Fused: analyze + personalize + compose (+ speak) ----------
+
+# personalized phrase is only spoken when the k-NN match is at least this confident
+PHRASE_MIN_CONFIDENCE = 0.75
+
+
+@app.post("/analyze-and-compose")
+async def analyze_and_compose(
+    file: UploadFile = File(...),
+    choices: List[str] = Form(default=[]),
+    user_id: Optional[str] = Form(default=None),
+    cohort: Optional[str] = Form(default=None),
+    speak: bool = Form(default=False),
+):
+    """
+    One round trip instead of /analyze-emotion + /compose-and-speak.
+    - features are extracted ONCE and shared by the emotion model and the
+      user's k-NN phrase matcher
+    - sentence is composed from the detected emotion + chosen icons, led by
+      the user's matched phrase when its confidence >= PHRASE_MIN_CONFIDENCE
+    - a silent / noise-only clip skips the emotion and phrase stages
+      (vocalization=false), but the chosen icons are still composed and spoken
+    - if speak=true, TTS audio is returned base64-encoded in the same JSON
+    - timings_ms reports how long each stage took
+    """
+    timings = {}
+    t_start = time.perf_counter()
+
+    audio_bytes = await file.read()
+
+    t0 = time.perf_counter()
+    try:
+        feature_vector = features_from_upload(audio_bytes)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    timings["features"] = (time.perf_counter() - t0) * 1000.0
+
+    vocalization = feature_vector is not None
+    raw_label, confidence, simple_label = None, 0.0, NO_VOCALIZATION_EMOTION
+    phrase, phrase_confidence = None, 0.0
+
+    if vocalization:
+        t0 = time.perf_counter()
+        try:
+            raw_label, confidence = predict_emotion_from_features(feature_vector, user_id, cohort)
+        except InvalidModelKey as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        simple_label = map_to_simple_emotion(raw_label)
+        timings["emotion"] = (time.perf_counter() - t0) * 1000.0
+
+        if user_id:
+            t0 = time.perf_counter()
+            phrase, phrase_confidence = predict_phrase(user_id, feature_vector)
+            timings["personalize"] = (time.perf_counter() - t0) * 1000.0
+
+    phrase_used = phrase is not None and phrase_confidence >= PHRASE_MIN_CONFIDENCE
+
+    t0 = time.perf_counter()
+    sentence = generate_sentence(simple_label, choices, phrase if phrase_used else None)
+    timings["compose"] = (time.perf_counter() - t0) * 1000.0
+
+    audio_b64, mime_type = None, None
+    if speak:
+        t0 = time.perf_counter()
+        try:
+            speech_bytes, mime_type = synthesize_speech(sentence)
+        except NotImplementedError as e:
+            raise HTTPException(status_code=501, detail=str(e))
+        audio_b64 = base64.b64encode(speech_bytes).decode("ascii")
+        timings["tts"] = (time.perf_counter() - t0) * 1000.0
+
+    timings["total"] = (time.perf_counter() - t_start) * 1000.0
+
+    return {
+        "raw_emotion": raw_label,
+        "emotion": simple_label,
+        "confidence": confidence,
+        "vocalization": vocalization,
+        "phrase": phrase,
+        "phrase_confidence": phrase_confidence,
+        "phrase_used": phrase_used,
+        "sentence": sentence,
+        "audio_base64": audio_b64,
+        "audio_mime_type": mime_type,
+        "timings_ms": timings,
+    }
+
+
+# ---------- 4) Bulk enrollment of personalized phrases ----------
+
+@app.post("/users/{user_id}/phrases/bulk")
+async def enroll_phrases_bulk(
+    user_id: str,
+    files: List[UploadFile] = File(...),
+    labels: List[str] = Form(...),
+    dedup_threshold: Optional[float] = Form(default=None),
+    max_prototypes_per_label: Optional[int] = Form(default=None),
+):
+    """
+    Caregiver uploads a whole recording session at once.
+    - files[i] is labelled with labels[i]
+    - features are extracted in parallel, the phrase DB is written once
+    - clips that fail are listed in "failed"; the rest are still enrolled
+    - dedup_threshold / max_prototypes_per_label turn on online compaction
+      (see Module3_personalize.add_user_phrase)
+    """
+    if len(files) != len(labels):
+        raise HTTPException(
+            status_code=400,
+            detail=f"got {len(files)} files but {len(labels)} labels",
+        )
+
+    temp_paths = []
+    items = []
+    try:
+        for upload, label in zip(files, labels):
+            suffix = os.path.splitext(upload.filename or "")[1] or ".wav"
+            with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as tmp:
+                tmp.write(await upload.read())
+                temp_paths.append(tmp.name)
+            items.append((tmp.name, label))
+
+        # CPU-heavy and blocking: keep it off the event loop
+        result = await run_in_threadpool(
+            add_user_phrases_from_audio_paths,
+            user_id,
+            items,
+            dedup_threshold=dedup_threshold,
+            max_prototypes_per_label=max_prototypes_per_label,
+        )
+    finally:
+        for path in temp_paths:
+            if os.path.exists(path):
+                os.remove(path)
+
+    # report the client's filenames, not our temp paths
+    by_path = {path: upload.filename for path, upload in zip(temp_paths, files)}
+    for failure in result["failed"]:
+        failure["filename"] = by_path.get(failure.pop("audio_path"))
+
+    return result
@@ -0,0 +1,241 @@
+# model_registry.py
+
+import os
+import re
+import shutil
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+import joblib
+
+MODEL_FILENAME = "emotion_model.pkl"
+SCALER_FILENAME = "scaler.pkl"
+CURRENT_FILENAME = "CURRENT"
+VERSIONS_DIRNAME = "versions"
+
+# keys come from client form fields: no separators, no "..", no absolute paths
+KEY_PATTERN = re.compile(r"^[A-Za-z0-9_-]+$")
+
+# old versions kept per key after a publish (readers may still be loading one)
+KEEP_VERSIONS = 3
+
+# default residency budget: total on-disk size of resident artifacts
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+
+class InvalidModelKey(ValueError):
+    """A user_id / cohort that cannot be used as a model key (client error)."""
+
+
+class ModelRegistry:
+    """
+    Per-user / per-cohort emotion models, loaded on demand.
+
+    Layout on disk:
+        <root_dir>/<key>/CURRENT                      -> name of the live version
+        <root_dir>/<key>/versions/<version>/emotion_model.pkl
+        <root_dir>/<key>/versions/<version>/scaler.pkl
+
+    - Keys must match KEY_PATTERN; anything else raises InvalidModelKey, so a
+      client-supplied id can never point outside root_dir.
+    - Resident models are kept in an LRU bounded by artifact size (bytes).
+    - A version is a directory that is never modified once published, and
+      CURRENT is flipped with a single os.replace(). A lookup therefore always
+      loads a matching (model, scaler) pair, and a new version is picked up on
+      the next lookup without restarting workers. Publish with save_model().
+    - Keys with no published version fall back to the global (model, scaler) pair.
+    - A version that fails to load is not retried until CURRENT names another one.
+    """
+
+    def __init__(
+        self,
+        root_dir: str,
+        fallback: Tuple[Any, Any],
+        max_bytes: int = DEFAULT_MAX_BYTES,
+    ):
+        self.root_dir = root_dir
+        self.fallback = fallback
+        self.max_bytes = max_bytes
+
+        # key -> {"model", "scaler", "version", "nbytes"}
+        self._resident: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._resident_bytes = 0
+        self._lock = threading.Lock()
+        self._key_locks: Dict[str, threading.Lock] = {}
+        # key -> version that failed to load (skipped until CURRENT changes)
+        self._failed: Dict[str, str] = {}
+
+        self.counters = {
+            "hits": 0,
+            "loads": 0,
+            "swaps": 0,
+            "evictions": 0,
+            "fallbacks": 0,
+            "load_errors": 0,
+        }
+
+    # ---------- paths / versions ----------
+
+    def _key_dir(self, key: str) -> str:
+        if not isinstance(key, str) or not KEY_PATTERN.match(key):
+            raise InvalidModelKey(f"invalid model key {key!r}")
+        return os.path.join(self.root_dir, key)
+
+    def _version_dir(self, key: str, version: str) -> str:
+        return os.path.join(self._key_dir(key), VERSIONS_DIRNAME, version)
+
+    def _disk_version(self, key: str) -> Optional[str]:
+        """Name of the live version (contents of CURRENT), or None if nothing is published."""
+        try:
+            with open(os.path.join(self._key_dir(key), CURRENT_FILENAME)) as f:
+                version = f.read().strip()
+        except (FileNotFoundError, NotADirectoryError):
+            return None
+        # CURRENT is written by save_model(), but don't follow it anywhere odd
+        return version if KEY_PATTERN.match(version) else None
+
+    # ---------- lookup ----------
+
+    def get(self, user_id: Optional[str] = None, cohort: Optional[str] = None) -> Tuple[Any, Any]:
+        """
+        Return (model, scaler) for user_id, else cohort, else the global pair.
+        """
+        for key in (user_id, cohort):
+            if not key:
+                continue
+            entry = self._get_entry(key)
+            if entry is not None:
+                return entry["model"], entry["scaler"]
+
+        with self._lock:
+            self.counters["fallbacks"] += 1
+        return self.fallback
+
+    def _get_entry(self, key: str) -> Optional[Dict[str, Any]]:
+        version = self._disk_version(key)
+
+        with self._lock:
+            entry = self._resident.get(key)
+            if entry is not None and (version is None or entry["version"] == version):
+                # resident and current (or artifacts removed: keep serving what we have)
+                self._resident.move_to_end(key)
+                self.counters["hits"] += 1
+                return entry
+            if version is None:
+                return None
+            if self._failed.get(key) == version:
+                # known-bad version: serve the previous one (if any) without reloading
+                return entry
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        # Only one thread loads a given key; others wait and then reuse it.
+        with key_lock:
+            with self._lock:
+                entry = self._resident.get(key)
+                if entry is not None and entry["version"] == version:
+                    self._resident.move_to_end(key)
+                    self.counters["hits"] += 1
+                    return entry
+            return self._load(key, version)
+
+    def _load(self, key: str, version: str) -> Optional[Dict[str, Any]]:
+        version_dir = self._version_dir(key, version)
+        model_path = os.path.join(version_dir, MODEL_FILENAME)
+        scaler_path = os.path.join(version_dir, SCALER_FILENAME)
+        try:
+            model = joblib.load(model_path)
+            scaler = joblib.load(scaler_path)
+            nbytes = os.path.getsize(model_path) + os.path.getsize(scaler_path)
+        except Exception as e:
+            print(f"⚠️ Failed to load model for '{key}': {e}")
+            with self._lock:
+                self.counters["load_errors"] += 1
+                self._failed[key] = version
+                # keep serving the previous version if there is one
+                return self._resident.get(key)
+
+        entry = {
+            "model": model,
+            "scaler": scaler,
+            "version": version,
+            "nbytes": nbytes,
+        }
+
+        with self._lock:
+            old = self._resident.pop(key, None)
+            if old is not None:
+                self._resident_bytes -= old["nbytes"]
+                self.counters["swaps"] += 1
+            self._resident[key] = entry
+            self._resident_bytes += entry["nbytes"]
+            self._failed.pop(key, None)
+            self.counters["loads"] += 1
+            self._evict_locked(keep=key)
+
+        return entry
+
+    def _evict_locked(self, keep: str) -> None:
+        """Drop least-recently-used models until under budget (never the one just loaded)."""
+        while self._resident_bytes > self.max_bytes and len(self._resident) > 1:
+            key, entry = next(iter(self._resident.items()))
+            if key == keep:
+                break
+            del self._resident[key]
+            self._resident_bytes -= entry["nbytes"]
+            self.counters["evictions"] += 1
+
+    # ---------- management ----------
+
+    def save_model(self, key: str, model: Any, scaler: Any) -> str:
+        """
+        Publish a new (model, scaler) version for key and return its name.
+        Both artifacts are written into a fresh version directory first; only
+        then is CURRENT switched to it with os.replace(), so readers see either
+        the old pair or the new pair, never a mix.
+        """
+        key_dir = self._key_dir(key)
+        versions_dir = os.path.join(key_dir, VERSIONS_DIRNAME)
+        os.makedirs(versions_dir, exist_ok=True)
+
+        version = f"{time.strftime('%Y%m%d-%H%M%S')}-{time.time_ns() % 1_000_000_000:09d}"
+        staging_dir = os.path.join(versions_dir, f".staging-{version}")
+        os.makedirs(staging_dir)
+        joblib.dump(model, os.path.join(staging_dir, MODEL_FILENAME))
+        joblib.dump(scaler, os.path.join(staging_dir, SCALER_FILENAME))
+        os.rename(staging_dir, os.path.join(versions_dir, version))
+
+        current_tmp = os.path.join(key_dir, CURRENT_FILENAME + ".tmp")
+        with open(current_tmp, "w") as f:
+            f.write(version)
+        os.replace(current_tmp, os.path.join(key_dir, CURRENT_FILENAME))
+
+        self._prune_versions(versions_dir, keep=version)
+        return version
+
+    def _prune_versions(self, versions_dir: str, keep: str) -> None:
+        """Remove all but the newest KEEP_VERSIONS published versions."""
+        versions = sorted(v for v in os.listdir(versions_dir) if KEY_PATTERN.match(v))
+        for old in versions[:max(0, len(versions) - KEEP_VERSIONS)]:
+            if old != keep:
+                shutil.rmtree(os.path.join(versions_dir, old), ignore_errors=True)
+
+    def evict(self, key: str) -> bool:
+        """Drop key from memory (it will be reloaded on next use)."""
+        with self._lock:
+            entry = self._resident.pop(key, None)
+            if entry is None:
+                return False
+            self._resident_bytes -= entry["nbytes"]
+            self.counters["evictions"] += 1
+            return True
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                **self.counters,
+                "resident": list(self._resident.keys()),
+                "resident_bytes": self._resident_bytes,
+                "max_bytes": self.max_bytes,
+            }
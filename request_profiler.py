@@ -0,0 +1,201 @@
+# request_profiler.py
+#
+# What a snapshot covers: cProfile / tracemalloc run on the event-loop thread
+# from request start to response end. That means:
+# - work this request hands to run_in_threadpool or a process pool (e.g. bulk
+#   enrollment) is NOT in the snapshot;
+# - anything else the event loop runs while this request awaits (other
+#   requests' synchronous feature extraction included) IS charged to it.
+# Profile under low concurrency, or read the snapshot with that in mind.
+
+import cProfile
+import hmac
+import os
+import random
+import re
+import threading
+import time
+import tracemalloc
+from typing import Optional
+
+# --- Configuration (env vars so it can be flipped per deployment) ---
+# Where snapshots go; only the newest PROFILE_MAX_FILES are kept (ring buffer).
+PROFILE_DIR = os.environ.get("PROFILE_DIR", "profiles")
+PROFILE_MAX_FILES = int(os.environ.get("PROFILE_MAX_FILES", "50"))
+# Fraction of requests profiled without being asked (0 = only on header).
+PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", "0"))
+# Mode used for sampled requests: "cprofile" or "tracemalloc".
+PROFILE_SAMPLE_MODE = os.environ.get("PROFILE_SAMPLE_MODE", "cprofile")
+# The X-Profile header is ignored unless this is set AND sent back in X-Profile-Token.
+# With it unset, only server-side sampling (PROFILE_SAMPLE_RATE) can profile.
+PROFILE_TOKEN = os.environ.get("PROFILE_TOKEN")
+
+PROFILE_HEADER = b"x-profile"
+PROFILE_TOKEN_HEADER = b"x-profile-token"
+PROFILE_FILE_HEADER = b"x-profile-file"
+MODES = ("cprofile", "tracemalloc")
+
+if PROFILE_SAMPLE_MODE not in MODES:
+    raise ValueError(f"PROFILE_SAMPLE_MODE must be one of {MODES}, got {PROFILE_SAMPLE_MODE!r}")
+
+TRACEMALLOC_TOP_N = 50
+
+# one profiled request at a time: cProfile / tracemalloc are per-process tools
+_busy = threading.Lock()
+
+
+def requested_mode(scope) -> Optional[str]:
+    """
+    Which profiler (if any) to run for this ASGI request.
+    With neither PROFILE_TOKEN nor PROFILE_SAMPLE_RATE configured this returns
+    immediately, without looking at the headers.
+    """
+    if PROFILE_TOKEN:
+        mode = token = None
+        for name, value in scope.get("headers", ()):
+            if name == PROFILE_HEADER:
+                mode = value.decode("latin-1").lower()
+            elif name == PROFILE_TOKEN_HEADER:
+                token = value
+        if (
+            mode is not None
+            and token is not None
+            and hmac.compare_digest(token, PROFILE_TOKEN.encode("latin-1"))
+        ):
+            return mode if mode in MODES else None
+
+    if PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE:
+        return PROFILE_SAMPLE_MODE
+    return None
+
+
+class ProfilingMiddleware:
+    """
+    Pure ASGI middleware: requests that aren't profiled are handed straight to
+    the app (no extra task, no response re-streaming). Profiled requests get
+    the snapshot file name in an X-Profile-File response header.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        mode = requested_mode(scope)
+        if mode is None:
+            return await self.app(scope, receive, send)
+
+        with RequestProfile(mode, scope.get("path", "")) as prof:
+            if prof.path is None:
+                # another request is being profiled: serve this one normally
+                return await self.app(scope, receive, send)
+
+            file_header = (PROFILE_FILE_HEADER, os.path.basename(prof.path).encode("latin-1"))
+
+            async def send_with_header(message):
+                if message["type"] == "http.response.start":
+                    message = {**message, "headers": [*message.get("headers", []), file_header]}
+                await send(message)
+
+            await self.app(scope, receive, send_with_header)
+
+
+class RequestProfile:
+    """
+    Context for one profiled request:
+
+        with RequestProfile("cprofile", "/analyze-emotion") as prof:
+            ...
+        prof.path  # snapshot file (named on enter, written on exit),
+                   # or None if another request was being profiled
+    """
+
+    def __init__(self, mode: str, label: str):
+        self.mode = mode
+        self.label = label
+        self.path = None
+        self._acquired = False
+        self._profiler = None
+        self._started_tracemalloc = False
+        self._t0 = 0.0
+
+    def __enter__(self):
+        self._acquired = _busy.acquire(blocking=False)
+        if not self._acquired:
+            return self
+
+        try:
+            self.path = self._new_path(".prof" if self.mode == "cprofile" else ".txt")
+        except OSError as e:
+            print(f"⚠️ Cannot create profile dir {PROFILE_DIR}: {e}")
+            self._acquired = False
+            _busy.release()
+            return self
+
+        self._t0 = time.perf_counter()
+        if self.mode == "cprofile":
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        else:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(25)
+                self._started_tracemalloc = True
+            tracemalloc.reset_peak()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if not self._acquired:
+            return False
+        try:
+            elapsed_ms = (time.perf_counter() - self._t0) * 1000.0
+            if self.mode == "cprofile":
+                self._profiler.disable()
+                self._profiler.dump_stats(self.path)
+            else:
+                snapshot = tracemalloc.take_snapshot()
+                current, peak = tracemalloc.get_traced_memory()
+                if self._started_tracemalloc:
+                    tracemalloc.stop()
+                self._write_tracemalloc(snapshot, current, peak, elapsed_ms)
+            _enforce_ring_buffer()
+        except Exception as e:
+            print(f"⚠️ Failed to write profile for {self.label}: {e}")
+            self.path = None
+        finally:
+            _busy.release()
+        return False
+
+    def _new_path(self, suffix: str) -> str:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        safe_label = re.sub(r"[^A-Za-z0-9_-]+", "_", self.label).strip("_") or "root"
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        return os.path.join(
+            PROFILE_DIR,
+            f"{stamp}-{time.time_ns() % 1_000_000_000:09d}_{safe_label}_{self.mode}{suffix}",
+        )
+
+    def _write_tracemalloc(self, snapshot, current, peak, elapsed_ms):
+        stats = snapshot.statistics("lineno")
+        with open(self.path, "w") as f:
+            f.write(f"request: {self.label}\n")
+            f.write(f"elapsed_ms: {elapsed_ms:.1f}\n")
+            f.write(f"traced_current_bytes: {current}\n")
+            f.write(f"traced_peak_bytes: {peak}\n\n")
+            f.write(f"top {TRACEMALLOC_TOP_N} allocation sites:\n")
+            for stat in stats[:TRACEMALLOC_TOP_N]:
+                f.write(f"{stat}\n")
+
+
+def _enforce_ring_buffer() -> None:
+    """Delete the oldest snapshots beyond PROFILE_MAX_FILES."""
+    files = sorted(
+        os.path.join(PROFILE_DIR, name)
+        for name in os.listdir(PROFILE_DIR)
+        if name.endswith((".prof", ".txt"))
+    )
+    for path in files[:max(0, len(files) - PROFILE_MAX_FILES)]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
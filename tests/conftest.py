@@ -0,0 +1,36 @@
+import os
+import sys
+from unittest import mock
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# features.py is imported as feature_extraction by the inference / personalization modules
+import features  # noqa: E402
+sys.modules.setdefault("feature_extraction", features)
+
+
+@pytest.fixture(scope="session")
+def inference():
+    """
+    emotional_interface_module2 without the trained artifacts: the model /
+    scaler pickles are not in the repo, so joblib.load is patched for the
+    import. The feature code itself is the real thing.
+    """
+    with mock.patch("joblib.load", return_value=None):
+        import emotional_interface_module2
+    return emotional_interface_module2
+
+
+@pytest.fixture(scope="session")
+def api(inference):
+    """main_fastapi on top of the artifact-free inference module."""
+    import main_fastapi
+    return main_fastapi
+
+
+@pytest.fixture
+def client(api):
+    from fastapi.testclient import TestClient
+    return TestClient(api.app)
@@ -0,0 +1,126 @@
+import io
+
+import numpy as np
+import soundfile as sf
+
+
+def _voiced_wav(sr=22050, seconds=1.0):
+    t = np.arange(int(sr * seconds)) / sr
+    y = 0.3 * np.sin(2 * np.pi * 220.0 * t)
+    buf = io.BytesIO()
+    sf.write(buf, y, sr, format="WAV", subtype="PCM_16")
+    return buf.getvalue()
+
+
+def test_corrupt_upload_is_400(client):
+    resp = client.post(
+        "/analyze-and-compose",
+        files={"file": ("clip.wav", b"RIFF not really a wav file", "audio/wav")},
+    )
+    assert resp.status_code == 400
+
+    resp = client.post(
+        "/analyze-emotion",
+        files={"file": ("clip.wav", b"RIFF not really a wav file", "audio/wav")},
+    )
+    assert resp.status_code == 400
+
+
+def test_model_width_mismatch_is_not_a_client_error(monkeypatch, api):
+    from fastapi.testclient import TestClient
+
+    def mismatched(*args, **kwargs):
+        raise ValueError("X has 84 features, but StandardScaler is expecting 174 features")
+    monkeypatch.setattr(api, "predict_emotion_from_features", mismatched)
+
+    no_raise = TestClient(api.app, raise_server_exceptions=False)
+    for path in ("/analyze-emotion", "/analyze-and-compose"):
+        resp = no_raise.post(path, files={"file": ("clip.wav", _voiced_wav(), "audio/wav")})
+        assert resp.status_code == 500
+
+
+def test_invalid_model_key_is_400(client):
+    resp = client.post(
+        "/analyze-emotion",
+        files={"file": ("clip.wav", _voiced_wav(), "audio/wav")},
+        data={"user_id": "../other"},
+    )
+    assert resp.status_code == 400
+
+
+def _post_with_phrase(client, monkeypatch, api, phrase_confidence):
+    monkeypatch.setattr(api, "predict_emotion_from_features", lambda *a, **kw: ("happy_laugh", 0.9))
+    monkeypatch.setattr(api, "predict_phrase", lambda user_id, fv: ("i_am_hungry", phrase_confidence))
+    return client.post(
+        "/analyze-and-compose",
+        files={"file": ("clip.wav", _voiced_wav(), "audio/wav")},
+        data={"user_id": "child_1", "choices": ["pizza"]},
+    ).json()
+
+
+def test_confident_phrase_leads_sentence(client, monkeypatch, api):
+    body = _post_with_phrase(client, monkeypatch, api, phrase_confidence=0.95)
+
+    assert body["phrase_used"] is True
+    assert body["sentence"] == "I am hungry. I feel happy and I would like to eat pizza."
+    assert {"features", "emotion", "personalize", "compose", "total"} <= body["timings_ms"].keys()
+
+
+def test_weak_phrase_is_not_spoken(client, monkeypatch, api):
+    body = _post_with_phrase(client, monkeypatch, api, phrase_confidence=0.2)
+
+    assert body["phrase"] == "i_am_hungry"
+    assert body["phrase_used"] is False
+    assert body["sentence"] == "I feel happy and I would like to eat pizza."
+
+
+def test_bulk_enrollment_passes_compaction_settings(client, monkeypatch, api):
+    calls = []
+
+    def fake_enroll(user_id, items, **kwargs):
+        calls.append((user_id, [label for _, label in items], kwargs))
+        return {"added": len(items), "failed": [], "total_examples": len(items)}
+    monkeypatch.setattr(api, "add_user_phrases_from_audio_paths", fake_enroll)
+
+    resp = client.post(
+        "/users/child_1/phrases/bulk",
+        files=[("files", ("a.wav", _voiced_wav(), "audio/wav"))],
+        data={"labels": ["hungry"], "dedup_threshold": "0.98", "max_prototypes_per_label": "8"},
+    )
+
+    assert resp.status_code == 200
+    assert calls == [("child_1", ["hungry"], {"dedup_threshold": 0.98, "max_prototypes_per_label": 8})]
+
+
+def _silent_pcm(inference, sr=22050, seconds=1.0):
+    samples = np.zeros(int(sr * seconds), dtype="<i2")
+    return inference.PCM_HEADER.pack(inference.PCM_MAGIC, sr) + samples.tobytes()
+
+
+def test_silent_clip_reports_neutral_emotion(client, inference):
+    body = client.post(
+        "/analyze-emotion",
+        files={"file": ("clip.pcm", _silent_pcm(inference), "application/octet-stream")},
+    ).json()
+
+    assert body["vocalization"] is False
+    assert body["emotion"] == "neutral"
+    assert body["raw_emotion"] is None
+
+
+def test_silent_clip_still_speaks_chosen_icons(client, monkeypatch, api, inference):
+    def not_called(*args, **kwargs):
+        raise AssertionError("emotion / phrase stage ran on a gated clip")
+    monkeypatch.setattr(api, "predict_emotion_from_features", not_called)
+    monkeypatch.setattr(api, "predict_phrase", not_called)
+
+    body = client.post(
+        "/analyze-and-compose",
+        files={"file": ("clip.pcm", _silent_pcm(inference), "application/octet-stream")},
+        data={"user_id": "child_1", "choices": ["pizza"]},
+    ).json()
+
+    assert body["vocalization"] is False
+    assert body["emotion"] == "neutral"
+    assert body["sentence"] == "I feel neutral and I want to eat pizza."
+    assert "emotion" not in body["timings_ms"] and "personalize" not in body["timings_ms"]
@@ -0,0 +1,122 @@
+import numpy as np
+import pandas as pd
+import pytest
+import soundfile as sf
+
+import features
+import frame_cache
+
+
+def _write_voiced_wav(path, sr=22050, seconds=1.0, f0=220.0):
+    t = np.arange(int(sr * seconds)) / sr
+    sf.write(path, 0.3 * np.sin(2 * np.pi * f0 * t), sr, subtype="PCM_16")
+
+
+def test_cached_frames_reproduce_features(tmp_path):
+    wav = str(tmp_path / "clip.wav")
+    _write_voiced_wav(wav)
+    cache_dir = str(tmp_path / "cache")
+
+    vector = features.extract_features(wav, frame_cache_dir=cache_dir, cache_key="ReCANVo/clip.wav")
+
+    assert frame_cache.is_cached(cache_dir, "ReCANVo/clip.wav")
+    frames = frame_cache.load_frames(cache_dir, "ReCANVo/clip.wav")
+    assert isinstance(frames, np.memmap)
+    assert frame_cache.n_mfcc_of(frames) == features.N_MFCC
+    np.testing.assert_allclose(frame_cache.aggregate(frames), vector)
+
+
+def test_build_feature_csv_from_cache(tmp_path):
+    cache_dir = str(tmp_path / "cache")
+    for i, f0 in enumerate((200.0, 300.0)):
+        wav = str(tmp_path / f"clip{i}.wav")
+        _write_voiced_wav(wav, f0=f0)
+        features.extract_features(wav, frame_cache_dir=cache_dir, cache_key=f"ReCANVo/clip{i}.wav")
+
+    csv_path = str(tmp_path / "out.csv")
+    frame_cache.build_feature_csv_from_cache(
+        cache_dir, csv_path, aggregators=("mean_std", "mfcc_delta", "percentiles", "voiced_ratio")
+    )
+
+    df = pd.read_csv(csv_path)
+    assert list(df["filepath"]) == ["ReCANVo/clip0.wav", "ReCANVo/clip1.wav"]
+    assert len([c for c in df.columns if c.startswith("feature_")]) == 84 + 80 + 6 + 2
+
+
+def test_cache_built_with_other_params_is_refused(tmp_path, monkeypatch):
+    wav = str(tmp_path / "clip.wav")
+    _write_voiced_wav(wav)
+    cache_dir = str(tmp_path / "cache")
+    features.extract_features(wav, frame_cache_dir=cache_dir, cache_key="a.wav")
+
+    meta = frame_cache.read_cache_meta(cache_dir)
+    assert meta["hop_length"] == features.HOP_LENGTH and meta["n_mfcc"] == features.N_MFCC
+
+    monkeypatch.setitem(features.FRAME_PARAMS, "hop_length", 256)
+    with pytest.raises(ValueError, match="hop_length"):
+        list(frame_cache.iter_cached_frames(cache_dir))
+    with pytest.raises(ValueError, match="hop_length"):
+        features.extract_features(wav, frame_cache_dir=cache_dir, cache_key="b.wav")
+    assert not frame_cache.is_cached(cache_dir, "b.wav")
+
+
+def test_cache_without_metadata_is_refused(tmp_path):
+    cache_dir = tmp_path / "cache"
+    cache_dir.mkdir()
+    np.save(cache_dir / "old.wav.npy", np.zeros((10, 44)))
+
+    with pytest.raises(ValueError, match="rebuild"):
+        list(frame_cache.iter_cached_frames(str(cache_dir)))
+
+
+class _FakeBlob:
+    def __init__(self, name, source):
+        self.name = name
+        self._source = source
+
+    def download_to_filename(self, filename):
+        with open(self._source, "rb") as src, open(filename, "wb") as dst:
+            dst.write(src.read())
+
+
+class _FakeBucket:
+    def __init__(self, blobs):
+        self._blobs = blobs
+
+    def list_blobs(self, prefix=""):
+        return [b for b in self._blobs if b.name.startswith(prefix)]
+
+
+class _FakeClient:
+    bucket_obj = None
+
+    def __init__(self, project=None):
+        pass
+
+    def bucket(self, name):
+        return self.bucket_obj
+
+
+def test_backfill_caches_only_uncached_clips(tmp_path, monkeypatch):
+    wav = str(tmp_path / "clip.wav")
+    _write_voiced_wav(wav)
+    cache_dir = str(tmp_path / "cache")
+    features.extract_features(wav, frame_cache_dir=cache_dir, cache_key="ReCANVo/old.wav")
+
+    _FakeClient.bucket_obj = _FakeBucket([
+        _FakeBlob("ReCANVo/old.wav", wav),
+        _FakeBlob("ReCANVo/new.wav", wav),
+        _FakeBlob("ReCANVo/notes.txt", wav),
+    ])
+    monkeypatch.setattr(features.storage, "Client", _FakeClient)
+    processed = []
+    real_process = features.process_gcs_blobs
+    monkeypatch.setattr(
+        features, "process_gcs_blobs",
+        lambda blobs, frame_cache_dir=None: processed.extend(b.name for b in blobs) or real_process(blobs, frame_cache_dir),
+    )
+
+    features.backfill_frame_cache("bucket", "ReCANVo/", frame_cache_dir=cache_dir)
+
+    assert processed == ["ReCANVo/new.wav"]
+    assert frame_cache.is_cached(cache_dir, "ReCANVo/new.wav")
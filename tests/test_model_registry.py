@@ -0,0 +1,101 @@
+import os
+
+import pytest
+
+import model_registry
+from model_registry import InvalidModelKey, ModelRegistry
+
+
+class _Tagged:
+    """Picklable stand-in for a model / scaler that remembers which version it belongs to."""
+
+    def __init__(self, tag):
+        self.tag = tag
+
+
+@pytest.fixture
+def registry(tmp_path):
+    return ModelRegistry(str(tmp_path), fallback=(_Tagged("global"), _Tagged("global")))
+
+
+def test_falls_back_when_nothing_published(registry):
+    model, scaler = registry.get("child_1")
+    assert model.tag == scaler.tag == "global"
+    assert registry.stats()["fallbacks"] == 1
+
+
+@pytest.mark.parametrize("key", ["../../x", "/tmp/evil", "a/b", "..", "child 1", "c\\d"])
+def test_rejects_keys_outside_root(registry, key):
+    with pytest.raises(InvalidModelKey, match="invalid model key"):
+        registry.get(key)
+    with pytest.raises(InvalidModelKey):
+        registry.save_model(key, _Tagged("x"), _Tagged("x"))
+
+
+def test_save_then_hot_swap_serves_matching_pairs(registry):
+    registry.save_model("child_1", _Tagged("v1"), _Tagged("v1"))
+    model, scaler = registry.get("child_1")
+    assert model.tag == scaler.tag == "v1"
+
+    registry.save_model("child_1", _Tagged("v2"), _Tagged("v2"))
+    model, scaler = registry.get("child_1")
+    assert model.tag == scaler.tag == "v2"
+
+    stats = registry.stats()
+    assert stats["loads"] == 2 and stats["swaps"] == 1
+
+
+def test_unpublished_version_dir_is_invisible(registry, tmp_path):
+    registry.save_model("child_1", _Tagged("v1"), _Tagged("v1"))
+
+    # a half-written next version (no CURRENT flip yet) must not be picked up
+    staging = tmp_path / "child_1" / "versions" / "99999999-999999-999999999"
+    staging.mkdir()
+    (staging / model_registry.MODEL_FILENAME).write_bytes(b"garbage")
+
+    model, scaler = registry.get("child_1")
+    assert model.tag == scaler.tag == "v1"
+
+
+def test_broken_version_is_not_reloaded(registry, tmp_path):
+    registry.save_model("child_1", _Tagged("v1"), _Tagged("v1"))
+    registry.get("child_1")
+
+    broken = registry.save_model("child_1", _Tagged("v2"), _Tagged("v2"))
+    (tmp_path / "child_1" / "versions" / broken / model_registry.MODEL_FILENAME).write_bytes(b"garbage")
+
+    for _ in range(3):
+        model, _ = registry.get("child_1")
+        assert model.tag == "v1"
+    assert registry.stats()["load_errors"] == 1
+
+    # a new publish clears it
+    registry.save_model("child_1", _Tagged("v3"), _Tagged("v3"))
+    model, _ = registry.get("child_1")
+    assert model.tag == "v3"
+
+
+def test_cohort_used_when_user_has_no_model(registry):
+    registry.save_model("cohort_a", _Tagged("cohort"), _Tagged("cohort"))
+    model, _ = registry.get("child_without_model", "cohort_a")
+    assert model.tag == "cohort"
+
+
+def test_old_versions_are_pruned(registry, tmp_path):
+    for i in range(model_registry.KEEP_VERSIONS + 2):
+        registry.save_model("child_1", _Tagged(i), _Tagged(i))
+    versions = os.listdir(tmp_path / "child_1" / "versions")
+    assert len(versions) == model_registry.KEEP_VERSIONS
+
+
+def test_lru_evicts_by_size(tmp_path):
+    registry = ModelRegistry(str(tmp_path), fallback=(None, None), max_bytes=1)
+    registry.save_model("a", _Tagged("a"), _Tagged("a"))
+    registry.save_model("b", _Tagged("b"), _Tagged("b"))
+
+    registry.get("a")
+    registry.get("b")
+
+    stats = registry.stats()
+    assert stats["resident"] == ["b"]
+    assert stats["evictions"] == 1
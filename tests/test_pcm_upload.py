@@ -0,0 +1,77 @@
+import io
+
+import numpy as np
+import pytest
+import soundfile as sf
+
+
+def _voiced_int16(sr, seconds=1.5):
+    t = np.arange(int(sr * seconds)) / sr
+    f0 = 220.0 + 15.0 * np.sin(2 * np.pi * 4.0 * t)
+    phase = 2 * np.pi * np.cumsum(f0) / sr
+    y = sum(np.sin(h * phase) / h for h in range(1, 5))
+    y = 0.4 * y / np.max(np.abs(y))
+    return (y * 32767).astype(np.int16)
+
+
+def _pcm_payload(inference, samples, sr):
+    return inference.PCM_HEADER.pack(inference.PCM_MAGIC, sr) + samples.astype("<i2").tobytes()
+
+
+def _wav_payload(samples, sr):
+    buf = io.BytesIO()
+    sf.write(buf, samples, sr, format="WAV", subtype="PCM_16")
+    return buf.getvalue()
+
+
+@pytest.mark.parametrize("sr", [22050, 44100])
+def test_pcm_features_match_wav_path(inference, sr):
+    samples = _voiced_int16(sr)
+
+    pcm = inference.pcm_features(_pcm_payload(inference, samples, sr))
+    wav = inference.audio_file_features(_wav_payload(samples, sr))
+
+    assert pcm is not None and wav is not None
+    np.testing.assert_allclose(pcm, wav, rtol=1e-5, atol=1e-6)
+
+
+def test_upload_dispatch(inference):
+    samples = _voiced_int16(22050)
+    assert inference.is_pcm_upload(_pcm_payload(inference, samples, 22050))
+    assert not inference.is_pcm_upload(_wav_payload(samples, 22050))
+
+
+def test_decode_is_zero_copy(inference):
+    samples = _voiced_int16(22050, seconds=0.1)
+    payload = _pcm_payload(inference, samples, 22050)
+
+    decoded, sr = inference.decode_pcm_upload(payload)
+
+    assert sr == 22050
+    np.testing.assert_array_equal(decoded, samples)
+    assert not decoded.flags.owndata
+    assert not decoded.flags.writeable  # a view over the immutable upload bytes
+
+
+def test_rejects_short_payload(inference):
+    with pytest.raises(ValueError, match="shorter than its header"):
+        inference.decode_pcm_upload(b"OMPC\x22")
+
+
+def test_rejects_odd_length(inference):
+    payload = inference.PCM_HEADER.pack(inference.PCM_MAGIC, 22050) + b"\x00\x01\x02"
+    with pytest.raises(ValueError, match="multiple of 2"):
+        inference.decode_pcm_upload(payload)
+
+
+def test_rejects_bad_magic(inference):
+    payload = inference.PCM_HEADER.pack(b"WAVE", 22050) + b"\x00\x00"
+    with pytest.raises(ValueError, match="magic"):
+        inference.decode_pcm_upload(payload)
+
+
+@pytest.mark.parametrize("sr", [0, 100, 7999, 96001, 2**32 - 1])
+def test_rejects_out_of_range_rate(inference, sr):
+    payload = inference.PCM_HEADER.pack(inference.PCM_MAGIC, sr) + b"\x00\x00" * 16
+    with pytest.raises(ValueError, match="sample rate"):
+        inference.decode_pcm_upload(payload)
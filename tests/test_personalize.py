@@ -0,0 +1,142 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+import Module3_personalize as m3
+
+
+def _ex(label, features, count=1):
+    return {"label": label, "features": list(features), "count": count}
+
+
+def test_vote_is_not_biased_by_prototype_count():
+    # label A: 100 clips compacted into a prototype far from the query;
+    # label B: two raw clips right next to it
+    query = np.array([1.0, 0.0])
+    library = [
+        _ex("B", [1.0, 0.01]),
+        _ex("B", [1.0, 0.02]),
+        _ex("A", [1.0, 0.30], count=100),
+        _ex("A", [0.0, 1.00], count=100),
+    ]
+
+    label, _ = m3.knn_vote(library, query, k=3)
+
+    assert label == "B"
+
+
+def test_compaction_bounds_prototypes_and_keeps_counts():
+    rng = np.random.default_rng(0)
+    examples = [_ex("A", rng.normal([5, 0, 0], 0.5)) for _ in range(40)]
+    examples += [_ex("B", rng.normal([0, 5, 0], 0.5)) for _ in range(6)]
+
+    compacted = m3.compact_examples(examples, max_prototypes_per_label=4, dedup_threshold=0.9999)
+
+    by_label = {}
+    for ex in compacted:
+        by_label.setdefault(ex["label"], []).append(ex)
+    assert len(by_label["A"]) <= 4 and len(by_label["B"]) <= 4
+    assert sum(ex["count"] for ex in by_label["A"]) == 40
+    assert sum(ex["count"] for ex in by_label["B"]) == 6
+
+
+def test_compaction_report_keeps_separable_accuracy(tmp_path):
+    rng = np.random.default_rng(1)
+    examples = [_ex("A", rng.normal([5, 0, 0], 0.3)) for _ in range(50)]
+    examples += [_ex("B", rng.normal([0, 5, 0], 0.3)) for _ in range(10)]
+    db_path = str(tmp_path / "user_phrases.json")
+    with open(db_path, "w") as f:
+        json.dump({"child_1": examples}, f)
+
+    report = m3.compaction_report("child_1", db_path=db_path, max_prototypes_per_label=3)
+
+    assert report["after"]["size"] <= 6
+    assert report["after"]["balanced_accuracy"] == report["before"]["balanced_accuracy"] == 1.0
+
+
+def test_compaction_keeps_raw_examples_and_can_be_undone(tmp_path):
+    rng = np.random.default_rng(2)
+    examples = [_ex("A", rng.normal([5, 0, 0], 0.3)) for _ in range(20)]
+    examples += [_ex("B", rng.normal([0, 5, 0], 0.3)) for _ in range(5)]
+    db_path = str(tmp_path / "user_phrases.json")
+    with open(db_path, "w") as f:
+        json.dump({"child_1": examples}, f)
+
+    m3.compact_user_phrases("child_1", db_path=db_path, max_prototypes_per_label=2)
+    db = m3.load_user_db(db_path)
+    assert len(db["child_1"]) == 25
+    assert len(db[m3.PROTOTYPES_KEY]["child_1"]) == 4
+    assert m3.predict_phrase("child_1", np.array([0, 5, 0]), db_path=db_path)[0] == "B"
+
+    # new enrollments reach both the raw list and the prototypes
+    m3.add_user_phrase("child_1", np.array([0, 0, 5]), "C", db_path=db_path)
+    assert m3.predict_phrase("child_1", np.array([0, 0, 5]), db_path=db_path, k=1)[0] == "C"
+
+    # re-tune from the raw examples, then undo
+    m3.compact_user_phrases("child_1", db_path=db_path, max_prototypes_per_label=5)
+    assert len(m3.load_user_db(db_path)[m3.PROTOTYPES_KEY]["child_1"]) > 5
+    assert m3.drop_user_prototypes("child_1", db_path=db_path)
+    db = m3.load_user_db(db_path)
+    assert "child_1" not in db[m3.PROTOTYPES_KEY] and len(db["child_1"]) == 26
+
+
+def _fake_extract(audio_path):
+    # runs inside forked pool workers
+    name = os.path.basename(audio_path)
+    if name == "crash":
+        os._exit(1)
+    if name == "empty":
+        return None
+    if name == "broken":
+        raise RuntimeError("bad header")
+    return np.array([1.0, 2.0, 3.0])
+
+
+@pytest.fixture
+def forked_enrollment_pool(monkeypatch):
+    """Shared enrollment pool on fork, so workers see the patched extractor."""
+    import multiprocessing
+    if "fork" not in multiprocessing.get_all_start_methods():
+        pytest.skip("needs fork so workers see the patched extractor")
+    monkeypatch.setattr(m3, "ENROLL_MP_CONTEXT", multiprocessing.get_context("fork"))
+    monkeypatch.setattr(m3, "ENROLL_MAX_WORKERS", 2)
+    monkeypatch.setattr(m3, "_enroll_pool", None)
+    yield
+    m3.shutdown_enrollment_pool()
+
+
+def test_bulk_enrollment_survives_failures_and_worker_crash(tmp_path, monkeypatch, forked_enrollment_pool):
+    monkeypatch.setattr(m3, "extract_features", _fake_extract)
+    db_path = str(tmp_path / "user_phrases.json")
+
+    items = [("ok1", "hungry"), ("crash", "hungry"), ("empty", "tired"),
+             ("broken", "tired"), ("ok2", "tired")]
+    pool = m3.start_enrollment_pool()
+    result = m3.add_user_phrases_from_audio_paths("child_1", items, db_path=db_path)
+
+    failed = {f["audio_path"]: f["error"] for f in result["failed"]}
+    assert result["added"] == 2
+    assert set(failed) == {"crash", "empty", "broken"}
+    assert "crashed" in failed["crash"]
+    assert result["total_examples"] == 2
+    assert len(m3.load_user_db(db_path)["child_1"]) == 2
+    # the broken pool was replaced, not reused
+    assert m3.start_enrollment_pool() is not pool
+
+
+def test_concurrent_writers_do_not_lose_batches(tmp_path):
+    from concurrent.futures import ThreadPoolExecutor
+    db_path = str(tmp_path / "user_phrases.json")
+    batch = [(np.array([1.0, 0.0]), "hungry")] * 5
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        writers = [executor.submit(m3.add_user_phrases, "child_1", batch, db_path) for _ in range(8)]
+        # readers racing the writers must never see a half-written file
+        readers = [executor.submit(m3.load_user_db, db_path) for _ in range(50)]
+        for future in writers + readers:
+            future.result()
+
+    assert len(m3.load_user_db(db_path)["child_1"]) == 40
+    assert os.listdir(tmp_path) == ["user_phrases.json"]
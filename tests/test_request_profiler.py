@@ -0,0 +1,89 @@
+import asyncio
+import os
+
+import pytest
+
+import request_profiler
+from request_profiler import ProfilingMiddleware
+
+
+@pytest.fixture
+def profiler_config(tmp_path, monkeypatch):
+    monkeypatch.setattr(request_profiler, "PROFILE_DIR", str(tmp_path / "profiles"))
+    monkeypatch.setattr(request_profiler, "PROFILE_TOKEN", None)
+    monkeypatch.setattr(request_profiler, "PROFILE_SAMPLE_RATE", 0.0)
+    return tmp_path / "profiles"
+
+
+def _scope(headers=()):
+    return {"type": "http", "path": "/analyze-emotion", "headers": list(headers)}
+
+
+def _run(app, scope):
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(ProfilingMiddleware(app)(scope, receive, send))
+    return sent, send
+
+
+async def _ok_app(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"ok"})
+
+
+def test_off_by_default_passes_through_untouched(profiler_config):
+    seen = {}
+
+    async def app(scope, receive, send):
+        seen["send"] = send
+        await _ok_app(scope, receive, send)
+
+    # even a client asking for it gets nothing without server-side enablement
+    sent, send = _run(app, _scope([(b"x-profile", b"cprofile")]))
+
+    assert seen["send"] is send  # no wrapping
+    assert sent[0]["headers"] == []
+    assert not profiler_config.exists()
+
+
+def test_header_needs_matching_token(profiler_config, monkeypatch):
+    monkeypatch.setattr(request_profiler, "PROFILE_TOKEN", "s3cret")
+
+    sent, _ = _run(_ok_app, _scope([(b"x-profile", b"cprofile"), (b"x-profile-token", b"wrong")]))
+    assert sent[0]["headers"] == []
+
+    sent, _ = _run(_ok_app, _scope([(b"x-profile", b"cprofile"), (b"x-profile-token", b"s3cret")]))
+    (name, value), = sent[0]["headers"]
+    assert name == b"x-profile-file"
+    assert os.path.exists(profiler_config / value.decode())
+
+
+def test_sampling_and_ring_buffer(profiler_config, monkeypatch):
+    monkeypatch.setattr(request_profiler, "PROFILE_SAMPLE_RATE", 1.0)
+    monkeypatch.setattr(request_profiler, "PROFILE_SAMPLE_MODE", "tracemalloc")
+    monkeypatch.setattr(request_profiler, "PROFILE_MAX_FILES", 2)
+
+    for _ in range(4):
+        sent, _ = _run(_ok_app, _scope())
+        assert sent[0]["headers"][0][0] == b"x-profile-file"
+
+    files = sorted(os.listdir(profiler_config))
+    assert len(files) == 2
+    assert all(f.endswith("_tracemalloc.txt") for f in files)
+
+
+def test_unknown_sample_mode_is_rejected(monkeypatch):
+    import importlib
+    monkeypatch.setenv("PROFILE_SAMPLE_MODE", "cprofil")
+    try:
+        with pytest.raises(ValueError, match="PROFILE_SAMPLE_MODE"):
+            importlib.reload(request_profiler)
+    finally:
+        monkeypatch.delenv("PROFILE_SAMPLE_MODE")
+        importlib.reload(request_profiler)
@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+import soundfile as sf
+
+import audio_preprocessing
+from audio_preprocessing import SR, has_vocalization, normalize_and_trim, preprocess_array
+
+import vad_benchmark
+
+
+@pytest.fixture
+def clips():
+    rng = np.random.default_rng(0)
+    return {
+        "silent": vad_benchmark._silent_clip(rng, 1.0),
+        "noise": vad_benchmark._noise_clip(rng, 1.0),
+        "voiced": vad_benchmark._voiced_clip(rng, 1.0),
+    }
+
+
+def test_gate_separates_silence_noise_and_voice(clips):
+    assert not has_vocalization(clips["silent"], SR)
+    assert not has_vocalization(clips["noise"], SR)
+    assert has_vocalization(clips["voiced"], SR)
+
+
+def test_thresholds_are_configurable(clips):
+    # the hiss clip only fails on zero-crossing rate, so relaxing that admits it
+    assert has_vocalization(clips["noise"], SR, max_zcr=1.0)
+    assert not has_vocalization(clips["voiced"], SR, min_rms=1.0)
+
+
+def test_gate_is_opt_in(clips, monkeypatch):
+    counters = dict.fromkeys(audio_preprocessing.vad_counters, 0)
+    monkeypatch.setattr(audio_preprocessing, "vad_counters", counters)
+
+    # a quiet but real recording is kept by default (training / upload path)
+    quiet = clips["voiced"] * 0.01
+    y, _ = preprocess_array(quiet, SR)
+    assert y.size > 0
+    assert counters["checked"] == 0
+
+    y, _ = preprocess_array(quiet, SR, vad=True)
+    assert y.size == 0
+    assert counters == {"checked": 1, "passed": 0, "rejected_silent": 1, "rejected_trimmed": 0}
+
+
+def test_normalize_and_trim_does_not_gate_by_default(clips, tmp_path):
+    path = str(tmp_path / "quiet.wav")
+    sf.write(path, clips["voiced"] * 0.01, SR, subtype="FLOAT")
+
+    y, _ = normalize_and_trim(path)
+    assert y.size > 0
+
+    y, _ = normalize_and_trim(path, vad=True)
+    assert y.size == 0
+
+
+def test_silent_pcm_upload_short_circuits(inference, clips):
+    samples = (clips["silent"] * 32767).astype("<i2")
+    payload = inference.PCM_HEADER.pack(inference.PCM_MAGIC, SR) + samples.tobytes()
+
+    assert inference.predict_emotion_from_pcm_bytes(payload) == (inference.NO_VOCALIZATION, 0.0)
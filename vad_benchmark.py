@@ -0,0 +1,90 @@
+# vad_benchmark.py
+#
+# How much CPU does the voice-activity gate save?
+# Runs the full feature pipeline on a synthetic mix of silent, noise-only and
+# voiced clips, once with the gate off and once with it on.
+#
+#   python vad_benchmark.py --clips 40 --silent-ratio 0.5
+
+import argparse
+import time
+import numpy as np
+
+from audio_preprocessing import SR, has_vocalization, vad_counters
+from features import extract_features_from_array
+
+
+def _silent_clip(rng, seconds):
+    # mic self-noise only, ~ -60 dBFS
+    return (rng.standard_normal(int(SR * seconds)) * 0.001).astype(np.float32)
+
+
+def _noise_clip(rng, seconds):
+    # room / fan hiss, ~ -30 dBFS but broadband (high zero-crossing rate)
+    return (rng.standard_normal(int(SR * seconds)) * 0.03).astype(np.float32)
+
+
+def _voiced_clip(rng, seconds):
+    # harmonic "hum" with vibrato and an amplitude envelope, plus background noise
+    t = np.arange(int(SR * seconds)) / SR
+    f0 = 250.0 + 20.0 * np.sin(2 * np.pi * 5.0 * t)
+    phase = 2 * np.pi * np.cumsum(f0) / SR
+    y = sum(np.sin(h * phase) / h for h in range(1, 6))
+    envelope = np.clip(np.sin(np.pi * t / seconds), 0.0, None)
+    y = 0.3 * envelope * y + rng.standard_normal(len(t)) * 0.003
+    return y.astype(np.float32)
+
+
+def make_mix(n_clips, silent_ratio, seconds, seed=0):
+    """Half of the non-voiced clips are near-silent, half are noise only."""
+    rng = np.random.default_rng(seed)
+    clips = []
+    for i in range(n_clips):
+        if rng.random() < silent_ratio:
+            make = _silent_clip if i % 2 == 0 else _noise_clip
+        else:
+            make = _voiced_clip
+        clips.append(make(rng, seconds))
+    return clips
+
+
+def run(clips, vad):
+    t0 = time.process_time()
+    n_none = sum(extract_features_from_array(y, SR, vad=vad) is None for y in clips)
+    return time.process_time() - t0, n_none
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Voice-activity gate CPU benchmark")
+    parser.add_argument("--clips", type=int, default=40)
+    parser.add_argument("--silent-ratio", type=float, default=0.5,
+                        help="fraction of clips that are silent or noise only")
+    parser.add_argument("--seconds", type=float, default=3.0)
+    args = parser.parse_args()
+
+    clips = make_mix(args.clips, args.silent_ratio, args.seconds)
+
+    # warm up numba / librosa caches so the first timed run isn't penalized
+    run(clips[:1], vad=False)
+
+    cpu_off, none_off = run(clips, vad=False)
+    for key in vad_counters:
+        vad_counters[key] = 0
+    cpu_on, none_on = run(clips, vad=True)
+
+    # gate cost on its own, per clip
+    t0 = time.perf_counter()
+    for y in clips:
+        has_vocalization(y, SR)
+    gate_us = (time.perf_counter() - t0) * 1e6 / len(clips)
+
+    print(f"{len(clips)} clips x {args.seconds:.1f}s, silent/noise ratio {args.silent_ratio:.2f}")
+    print(f"  gate off: {cpu_off:.2f}s CPU, {none_off} clips without features")
+    print(f"  gate on : {cpu_on:.2f}s CPU, {none_on} clips without features")
+    print(f"  saved   : {cpu_off - cpu_on:.2f}s CPU ({100.0 * (cpu_off - cpu_on) / max(cpu_off, 1e-9):.1f}%)")
+    print(f"  gate    : {gate_us:.0f} µs per clip")
+    print(f"  counters: {vad_counters}")
+
+
+if __name__ == "__main__":
+    main()